@@ -7,6 +7,11 @@ block_cipher = None
 # Get the current directory
 SPEC_DIR = os.path.dirname(os.path.abspath(SPEC))
 
+# LOT_ONEDIR=1 builds dist/LOT/ (LOT.exe next to its libraries) instead of a single LOT.exe.
+# A single exe unpacks itself to a temp folder on every launch; the folder build starts directly,
+# which is most of the cold-start time on slower disks.
+ONEDIR = os.environ.get('LOT_ONEDIR') == '1'
+
 a = Analysis(
     ['run_app.py'],
     pathex=[SPEC_DIR],
@@ -24,6 +29,7 @@ a = Analysis(
         'sqlalchemy',
         'sqlalchemy.dialects.sqlite',
         'jinja2',
+        'waitress',
     ],
     hookspath=[],
     hooksconfig={},
@@ -37,20 +43,13 @@ a = Analysis(
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
-    [],
+exe_options = dict(
     name='LOT',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=not ONEDIR,  # UPX-packed libraries are unpacked again at every start
     upx_exclude=[],
-    runtime_tmpdir=None,
     console=False,  # No console window - app runs in its own window
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -59,3 +58,9 @@ exe = EXE(
     entitlements_file=None,
     icon=None,  # Add icon path here if you have one: icon='icon.ico'
 )
+
+if ONEDIR:
+    exe = EXE(pyz, a.scripts, [], exclude_binaries=True, **exe_options)
+    coll = COLLECT(exe, a.binaries, a.zipfiles, a.datas, strip=False, upx=False, name='LOT')
+else:
+    exe = EXE(pyz, a.scripts, a.binaries, a.zipfiles, a.datas, [], runtime_tmpdir=None, **exe_options)
@@ -1,13 +1,26 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-from sqlalchemy import String, Text, TypeDecorator, event
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+from functools import wraps
+from sqlalchemy import String, Text, TypeDecorator, and_, case, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import validates, attributes
 from sqlalchemy.dialects import sqlite
+import click
+import cProfile
 import csv
 import io
+import itertools
+import json
 import os
+import sqlite3
+import sys
+import threading
+import time
 import logging
 
 # Setup logging
@@ -36,10 +49,273 @@ class TextString(TypeDecorator):
             return value[1:]
         return str(value)
 
+def format_ticket_number(value, width):
+    """Format an integer ticket number back to its zero-padded display form"""
+    return str(value).zfill(width or 0)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'lottery-secret-key-2026'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///lottery.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('LOT_DATABASE_URI', 'sqlite:///lottery.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLITE_PROFILE'] = os.environ.get('LOT_SQLITE_PROFILE', 'performance')
+app.config['DIAGNOSTICS'] = os.environ.get('LOT_DIAGNOSTICS') == '1'
+app.config['STOCK_COMPACT_INTERVAL'] = int(os.environ.get('LOT_STOCK_COMPACT_INTERVAL', '0'))
+app.config['AVAILABILITY_INDEX'] = os.environ.get('LOT_AVAILABILITY_INDEX', '1') == '1'
+app.config['EXTERNAL_WRITE_CHECK_SECONDS'] = float(os.environ.get('LOT_EXTERNAL_WRITE_CHECK_SECONDS', '1'))
+app.config['SERVER'] = os.environ.get('LOT_SERVER', 'auto')
+app.config['SERVER_THREADS'] = int(os.environ.get('LOT_SERVER_THREADS', '16'))
+# Live-update streams allowed at once; each holds a server thread, so by default half the threads
+# stay free for API requests and further windows poll instead
+app.config['SSE_MAX_STREAMS'] = int(os.environ.get('LOT_SSE_MAX_STREAMS', '0')) or max(1, app.config['SERVER_THREADS'] // 2)
+app.config['PROFILE_SLOW_MS'] = float(os.environ.get('LOT_PROFILE_SLOW_MS', '0'))
+app.config['PROFILER'] = os.environ.get('LOT_PROFILER', 'cprofile')
+app.config['PROFILE_DIR'] = os.environ.get('LOT_PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+# Request diagnostics. Off by default and then only costs one check per call site. Turned on for
+# every request by the admin toggle (or LOT_DIAGNOSTICS=1), or for a single request by an admin
+# sending the X-Lot-Diagnostics: 1 header. Records go to the 'lot.diagnostics' logger as JSON.
+DIAGNOSTICS_HEADER = 'X-Lot-Diagnostics'
+diagnostics_logger = logging.getLogger('lot.diagnostics')
+
+def diagnostics_enabled():
+    """Whether diagnostics records should be written for the current request"""
+    if app.config['DIAGNOSTICS']:
+        return True
+    if not has_request_context() or request.headers.get(DIAGNOSTICS_HEADER) != '1':
+        return False
+    return current_user.is_authenticated and current_user.is_admin
+
+def diagnose(event_name, **fields):
+    """Write one structured diagnostics record; values are only formatted when diagnostics are on"""
+    if not diagnostics_enabled():
+        return
+    diagnostics_logger.info(json.dumps({'event': event_name, **fields}, default=str))
+
+# Request metrics. Every request records its latency, SQL statement count and SQL time per route;
+# the totals are served in Prometheus text format at /api/admin/metrics. SQL run outside a request
+# (migrations, the background compactor) is not counted.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestMetrics:
+    """Per-route request counters and latency histograms, shared by all request threads"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self._routes = {}
+    
+    def observe(self, method, route, status, seconds, statements, sql_seconds):
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = {
+                    'statuses': {}, 'buckets': [0] * len(self.buckets), 'count': 0, 'seconds': 0.0,
+                    'statements': 0, 'sql_seconds': 0.0
+                }
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['statements'] += statements
+            stats['sql_seconds'] += sql_seconds
+    
+    def render(self):
+        """The metrics in Prometheus text exposition format"""
+        with self._lock:
+            routes = sorted((key, {**stats, 'statuses': dict(stats['statuses']), 'buckets': list(stats['buckets'])})
+                            for key, stats in self._routes.items())
+        
+        def labels(method, route, **extra):
+            pairs = {'method': method, 'route': route, **extra}
+            return ','.join(f'{k}="{v}"' for k, v in pairs.items())
+        
+        lines = [
+            '# HELP lot_http_requests_total Requests handled, by route and status.',
+            '# TYPE lot_http_requests_total counter'
+        ]
+        for (method, route), stats in routes:
+            for status, count in sorted(stats['statuses'].items()):
+                lines.append(f'lot_http_requests_total{{{labels(method, route, status=status)}}} {count}')
+        
+        lines += [
+            '# HELP lot_http_request_duration_seconds Request latency, by route.',
+            '# TYPE lot_http_request_duration_seconds histogram'
+        ]
+        for (method, route), stats in routes:
+            for bound, count in zip(self.buckets, stats['buckets']):
+                lines.append(f'lot_http_request_duration_seconds_bucket{{{labels(method, route, le=bound)}}} {count}')
+            lines.append(f'lot_http_request_duration_seconds_bucket{{{labels(method, route, le="+Inf")}}} {stats["count"]}')
+            lines.append(f'lot_http_request_duration_seconds_sum{{{labels(method, route)}}} {stats["seconds"]:.6f}')
+            lines.append(f'lot_http_request_duration_seconds_count{{{labels(method, route)}}} {stats["count"]}')
+        
+        lines += [
+            '# HELP lot_sql_statements_total SQL statements executed by requests, by route.',
+            '# TYPE lot_sql_statements_total counter'
+        ]
+        for (method, route), stats in routes:
+            lines.append(f'lot_sql_statements_total{{{labels(method, route)}}} {stats["statements"]}')
+        
+        lines += [
+            '# HELP lot_sql_duration_seconds_total Time spent executing SQL in requests, by route.',
+            '# TYPE lot_sql_duration_seconds_total counter'
+        ]
+        for (method, route), stats in routes:
+            lines.append(f'lot_sql_duration_seconds_total{{{labels(method, route)}}} {stats["sql_seconds"]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+request_metrics = RequestMetrics()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info['statement_started'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def count_request_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('statement_started', None)
+    if started is None or not has_request_context():
+        return
+    g.sql_statements = g.get('sql_statements', 0) + 1
+    g.sql_seconds = g.get('sql_seconds', 0.0) + time.perf_counter() - started
+
+def _start_profiler():
+    """Start the configured profiler for this request thread; None when it is unavailable"""
+    if app.config['PROFILER'] == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("LOT_PROFILER=pyinstrument but pyinstrument is not installed, using cProfile")
+            app.config['PROFILER'] = 'cprofile'
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # A profiler is already active: on Python 3.12+ cProfile allows only one per process (so
+        # overlapping slow-request profiles are skipped), before that one per thread
+        return None
+    return profiler
+
+def _save_profile(profiler, method, route, elapsed_ms):
+    """Write a slow request's trace to PROFILE_DIR (.prof for cProfile, .html for pyinstrument)"""
+    os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+    slug = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'index'
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{method}-{slug}-{elapsed_ms:.0f}ms"
+    path = os.path.join(app.config['PROFILE_DIR'], name)
+    if isinstance(profiler, cProfile.Profile):
+        profiler.dump_stats(path + '.prof')
+    else:
+        with open(path + '.html', 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    logger.info(f"Slow request {method} {route} took {elapsed_ms:.0f} ms, profile written to {path}")
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    # Slow-request profiling profiles every request (so it costs time) and keeps the slow ones
+    if app.config['PROFILE_SLOW_MS'] > 0:
+        g.profiler = _start_profiler()
+
+def _finish_request_metrics(status):
+    """Stop the request's profiler and record its metrics (once per request)"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+    
+    statements, sql_seconds = g.get('sql_statements', 0), g.get('sql_seconds', 0.0)
+    request_metrics.observe(request.method, route, status, elapsed, statements, sql_seconds)
+    if profiler is not None and elapsed * 1000 >= app.config['PROFILE_SLOW_MS']:
+        _save_profile(profiler, request.method, route, elapsed * 1000)
+    
+    diagnose('request.finished', method=request.method, route=route, status=status,
+             ms=round(elapsed * 1000, 2), sql_statements=statements, sql_ms=round(sql_seconds * 1000, 2))
+
+@app.after_request
+def record_request_metrics(response):
+    _finish_request_metrics(response.status_code)
+    return response
+
+@app.teardown_request
+def record_failed_request_metrics(exc):
+    # after_request is skipped when a view raises and the exception propagates (debug mode,
+    # PROPAGATE_EXCEPTIONS); count the request as a 500 and stop its profiler here instead
+    _finish_request_metrics(500)
+
+# SQLite connection profiles, applied as PRAGMAs on every new connection
+SQLITE_PROFILES = {
+    # SQLite's own defaults (rollback journal, synchronous=FULL) plus a busy timeout.
+    # journal_mode is set explicitly because WAL persists in the database file.
+    'default': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000
+    },
+    # WAL lets readers run alongside the single writer; synchronous=NORMAL is durable
+    # across application crashes in WAL mode and only syncs at checkpoints
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -20000,  # KiB (about 20 MB)
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY'
+    }
+}
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_profile(dbapi_connection, connection_record):
+    """Apply the configured SQLITE_PROFILE pragmas to each new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    profile = SQLITE_PROFILES.get(app.config.get('SQLITE_PROFILE'), SQLITE_PROFILES['default'])
+    cursor = dbapi_connection.cursor()
+    for pragma, value in profile.items():
+        cursor.execute(f'PRAGMA {pragma}={value}')
+    cursor.close()
+
+def check_sqlite_pragmas():
+    """
+    Log the effective pragmas on a live connection and warn about any the database did not accept
+    (WAL, for example, is unavailable on some network drives). Returns {pragma: effective value}.
+    """
+    from sqlalchemy import text
+    profile_name = app.config.get('SQLITE_PROFILE')
+    if profile_name not in SQLITE_PROFILES:
+        logger.warning(f"Unknown SQLITE_PROFILE '{profile_name}', using 'default'")
+        profile_name = 'default'
+    requested = SQLITE_PROFILES[profile_name]
+    
+    effective = {}
+    with db.engine.connect() as connection:
+        for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store'):
+            effective[pragma] = connection.execute(text(f'PRAGMA {pragma}')).scalar()
+    
+    # synchronous and temp_store read back as numbers
+    named = {
+        'synchronous': {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'},
+        'temp_store': {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'}
+    }
+    for pragma, names in named.items():
+        effective[pragma] = names.get(effective[pragma], effective[pragma])
+    
+    logger.info(f"SQLite profile '{profile_name}': " + ', '.join(f'{k}={v}' for k, v in effective.items()))
+    for pragma, value in requested.items():
+        if str(effective.get(pragma)).upper() != str(value).upper():
+            logger.warning(f"SQLite pragma {pragma} requested {value} but is {effective.get(pragma)}")
+    return effective
 
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
@@ -48,6 +324,27 @@ login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
 # Database Models
+class TicketRangeMixin:
+    """
+    Ticket range columns shared by stock and sale entries.
+    start_number/end_number keep the zero-padded display form, while start_value/end_value
+    hold the same numbers as INTEGER (plus the padding width) so range predicates run in SQL
+    and can use B-tree indexes. The integer columns are derived from the text on assignment.
+    """
+    start_value = db.Column(db.Integer)
+    end_value = db.Column(db.Integer)
+    number_width = db.Column(db.Integer)
+    
+    @validates('start_number', 'end_number')
+    def _sync_ticket_value(self, key, value):
+        value = str(value).strip()
+        if key == 'start_number':
+            self.start_value = int(value)
+            self.number_width = len(value)
+        else:
+            self.end_value = int(value)
+        return value
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -77,7 +374,7 @@ class Party(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     sale_entries = db.relationship('SaleEntry', backref='party', lazy=True)
 
-class StockEntry(db.Model):
+class StockEntry(TicketRangeMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     distributor_id = db.Column(db.Integer, db.ForeignKey('distributor.id'), nullable=True)
@@ -91,8 +388,22 @@ class StockEntry(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    origin_id = db.Column(db.Integer)  # Purchase this row was split from (NULL on the purchase itself)
+    
+    @property
+    def lot_id(self):
+        """Id of the purchase this stock row belongs to"""
+        return self.origin_id or self.id
+    
+    # Range index used by overlap/containment lookups (ordered by numeric start per category/code),
+    # plus the date and distributor listing filters. Existing databases get these via MIGRATIONS.
+    __table_args__ = (
+        db.Index('ix_stock_entry_code_start', 'category_id', 'ticket_code', 'start_value'),
+        db.Index('ix_stock_entry_date', 'entry_date'),
+        db.Index('ix_stock_entry_distributor_date', 'distributor_id', 'entry_date'),
+    )
 
-class SaleEntry(db.Model):
+class SaleEntry(TicketRangeMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     party_id = db.Column(db.Integer, db.ForeignKey('party.id'), nullable=True)
@@ -107,6 +418,684 @@ class SaleEntry(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     sale_category = db.relationship('Category', backref='sale_entries')
+    allocations = db.relationship('SaleAllocation', backref='sale_entry', lazy=True,
+                                  cascade='all, delete-orphan', order_by='SaleAllocation.start_value')
+    
+    __table_args__ = (
+        db.Index('ix_sale_entry_code_start', 'category_id', 'ticket_code', 'start_value'),
+        db.Index('ix_sale_entry_date', 'entry_date'),
+        db.Index('ix_sale_entry_party_date', 'party_id', 'entry_date'),
+    )
+
+class SaleAllocation(db.Model):
+    """
+    The part of a sale taken from one stock lot, recorded at sale time together with that lot's
+    distributor, rate, purchase date and notes, so deleting the sale puts the tickets back into
+    the same lot at the same cost.
+    """
+    __tablename__ = 'sale_allocation'
+    id = db.Column(db.Integer, primary_key=True)
+    sale_entry_id = db.Column(db.Integer, db.ForeignKey('sale_entry.id'), nullable=False, index=True)
+    start_value = db.Column(db.Integer, nullable=False)
+    end_value = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    distributor_id = db.Column(db.Integer, db.ForeignKey('distributor.id'), nullable=True)
+    rate = db.Column(db.Float, nullable=False, default=0)
+    entry_date = db.Column(db.Date, nullable=False)  # Purchase date of the source lot
+    notes = db.Column(db.Text)
+    origin_id = db.Column(db.Integer)  # lot_id of the source lot
+
+class StockBalance(db.Model):
+    """
+    Materialized stock totals per category, ticket code and purchase date.
+    Maintained incrementally in the same transaction as every StockEntry change, so readers
+    get current stock from O(categories) rows instead of summing every entry.
+    """
+    __tablename__ = 'stock_balance'
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    ticket_code = db.Column(db.String(10), primary_key=True)  # '' for entries without a code
+    entry_date = db.Column(db.Date, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    entries = db.Column(db.Integer, nullable=False, default=0)  # Number of stock fragments
+
+class WriteCounter(db.Model):
+    """Single row counting the write transactions committed to this database by any process"""
+    __tablename__ = 'write_counter'
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+# Stock balance maintenance
+BALANCE_FIELDS = ('category_id', 'ticket_code', 'entry_date', 'quantity', 'amount')
+
+def _stock_snapshot(entry, committed):
+    """Balance-relevant values of a stock entry, either as last flushed (committed) or as pending"""
+    values = {}
+    for field in BALANCE_FIELDS:
+        history = attributes.get_history(entry, field)
+        if committed and history.deleted:
+            values[field] = history.deleted[0]
+        else:
+            values[field] = getattr(entry, field)
+    return values
+
+# Load the previous value whenever these attributes are set (even on expired instances),
+# so the flush hook always sees exact before/after values
+for _field in BALANCE_FIELDS:
+    event.listen(getattr(StockEntry, _field), 'set', lambda target, value, oldvalue, initiator: None, active_history=True)
+
+def _add_balance_delta(deltas, values, sign):
+    if values['category_id'] is None or values['entry_date'] is None:
+        return
+    key = (values['category_id'], values['ticket_code'] or '', values['entry_date'])
+    quantity, amount, entries = deltas.get(key, (0, 0, 0))
+    deltas[key] = (
+        quantity + sign * (values['quantity'] or 0),
+        amount + sign * (values['amount'] or 0),
+        entries + sign
+    )
+
+def apply_stock_balance_deltas(connection, deltas):
+    """
+    Upsert {(category_id, ticket_code, entry_date): (quantity, amount, entries)} deltas into
+    stock_balance on the given connection and drop rows that no longer hold any stock.
+    Bulk paths that bypass the ORM flush call this directly.
+    """
+    rows = [{
+        'category_id': category_id,
+        'ticket_code': ticket_code or '',
+        'entry_date': entry_date,
+        'quantity': quantity,
+        'amount': amount,
+        'entries': entries
+    } for (category_id, ticket_code, entry_date), (quantity, amount, entries) in deltas.items()
+      if quantity or amount or entries]
+    if not rows:
+        return
+    
+    table = StockBalance.__table__
+    stmt = sqlite.insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.category_id, table.c.ticket_code, table.c.entry_date],
+        set_={
+            'quantity': table.c.quantity + stmt.excluded.quantity,
+            'amount': table.c.amount + stmt.excluded.amount,
+            'entries': table.c.entries + stmt.excluded.entries
+        }
+    )
+    connection.execute(stmt, rows)
+    connection.execute(table.delete().where(table.c.entries <= 0))
+
+@event.listens_for(db.session, 'before_flush')
+def track_stock_balance(session, flush_context, instances):
+    """Fold pending StockEntry inserts, updates and deletes into stock_balance before they flush"""
+    deltas = {}
+    for entry in session.new:
+        if isinstance(entry, StockEntry):
+            _add_balance_delta(deltas, _stock_snapshot(entry, committed=False), 1)
+    for entry in session.dirty:
+        if isinstance(entry, StockEntry) and session.is_modified(entry):
+            _add_balance_delta(deltas, _stock_snapshot(entry, committed=True), -1)
+            _add_balance_delta(deltas, _stock_snapshot(entry, committed=False), 1)
+    for entry in session.deleted:
+        if isinstance(entry, StockEntry):
+            _add_balance_delta(deltas, _stock_snapshot(entry, committed=True), -1)
+    
+    if deltas:
+        apply_stock_balance_deltas(session.connection(), deltas)
+
+def compute_stock_balance():
+    """Stock totals recomputed from scratch, keyed like stock_balance"""
+    rows = db.session.query(
+        StockEntry.category_id,
+        db.func.coalesce(StockEntry.ticket_code, ''),
+        StockEntry.entry_date,
+        db.func.sum(StockEntry.quantity),
+        db.func.sum(StockEntry.amount),
+        db.func.count(StockEntry.id)
+    ).group_by(StockEntry.category_id, db.func.coalesce(StockEntry.ticket_code, ''), StockEntry.entry_date).all()
+    return {(c, code, d): (q or 0, a or 0, n) for c, code, d, q, a, n in rows}
+
+def verify_stock_balance():
+    """
+    Compare stock_balance with a full recomputation.
+    Returns a list of (key, stored, expected) tuples for every key that drifted.
+    """
+    expected = compute_stock_balance()
+    stored = {(b.category_id, b.ticket_code, b.entry_date): (b.quantity, b.amount, b.entries)
+              for b in StockBalance.query.all()}
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        exp = expected.get(key, (0, 0, 0))
+        got = stored.get(key, (0, 0, 0))
+        if exp[0] != got[0] or exp[2] != got[2] or abs(exp[1] - got[1]) > 0.005:
+            drift.append((key, got, exp))
+    return drift
+
+def rebuild_stock_balance():
+    """Recompute stock_balance from scratch (caller commits)"""
+    db.session.execute(StockBalance.__table__.delete())
+    apply_stock_balance_deltas(db.session.connection(), compute_stock_balance())
+
+@app.cli.command('stock-balance')
+@click.argument('action', type=click.Choice(['verify', 'rebuild']))
+def stock_balance_command(action):
+    """Verify stock_balance against stock entries, or rebuild it from scratch."""
+    drift = verify_stock_balance()
+    for (category_id, ticket_code, entry_date), stored, expected in drift:
+        click.echo(f'Drift for category {category_id} code {ticket_code or "-"} on {entry_date}: '
+                   f'stored qty/amount/entries {stored}, expected {expected}')
+    click.echo(f'{len(drift)} stock balance rows drifted')
+    
+    if action == 'rebuild':
+        rebuild_stock_balance()
+        db.session.commit()
+        click.echo('Stock balance rebuilt')
+    elif drift:
+        sys.exit(1)
+
+# Ticket availability index. Per category it keeps the stock ranges of each ticket code in
+# run-length form (one (start, end) run per stock row, sorted by start), so "is this range in
+# stock" and "which tickets of this span are available" are a bisect and a short walk instead of
+# a query. A category is loaded on first use and then patched from every committed stock write;
+# Core statements on stock_entry (bulk loads) drop the index so it reloads, and so does a write
+# by another process (see ExternalWrites). LOT_AVAILABILITY_INDEX=0 turns it off and the
+# availability queries go to SQL.
+StockRun = namedtuple('StockRun', 'start end entry_date stock_id width')
+STOCK_RUN_FIELDS = ('category_id', 'ticket_code', 'start_value', 'end_value', 'entry_date', 'number_width')
+
+class TicketRuns:
+    """Disjoint stock runs of one category/code, sorted by start (parallel start list for bisect)"""
+    __slots__ = ('starts', 'runs')
+    
+    def __init__(self, runs=()):
+        self.runs = sorted(runs)
+        self.starts = [run.start for run in self.runs]
+    
+    def add(self, run):
+        i = bisect_left(self.starts, run.start)
+        while i < len(self.starts) and self.starts[i] == run.start:
+            if self.runs[i] == run:
+                return
+            i += 1
+        self.starts.insert(i, run.start)
+        self.runs.insert(i, run)
+    
+    def remove(self, run):
+        i = bisect_left(self.starts, run.start)
+        while i < len(self.starts) and self.starts[i] == run.start:
+            if self.runs[i] == run:
+                del self.starts[i]
+                del self.runs[i]
+                return
+            i += 1
+    
+    def covering(self, start, end, as_of=None):
+        """The runs that together hold start..end without a gap, in order; None if any ticket is missing"""
+        i = bisect_right(self.starts, start) - 1
+        if i < 0:
+            return None
+        lots = []
+        position = start
+        while i < len(self.runs):
+            run = self.runs[i]
+            if run.start > position or run.end < position or (as_of and run.entry_date > as_of):
+                return None
+            lots.append(run)
+            if run.end >= end:
+                return lots
+            position = run.end + 1
+            i += 1
+        return None
+    
+    def available(self, start, end, as_of=None):
+        """Available sub-ranges of start..end as [(start, end)], touching runs merged"""
+        result = []
+        for i in range(max(bisect_right(self.starts, start) - 1, 0), len(self.runs)):
+            run = self.runs[i]
+            if run.start > end:
+                break
+            if run.end < start or (as_of and run.entry_date > as_of):
+                continue
+            piece_start, piece_end = max(run.start, start), min(run.end, end)
+            if result and result[-1][1] == piece_start - 1:
+                result[-1] = (result[-1][0], piece_end)
+            else:
+                result.append((piece_start, piece_end))
+        return result
+
+class AvailabilityIndex:
+    """Lazily loaded {category_id: {ticket_code: TicketRuns}}, shared by all request threads"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._categories = {}
+        # Writes committed while a category loads, replayed onto it once it is in (None: discard the load)
+        self._pending = {}
+        # Sequence of the last write applied per stock id, so commits whose after_commit hooks
+        # run out of order cannot put back an older version of a row. Only needed while an older
+        # write is still in flight (flushed, transaction not ended), so it is pruned as they end.
+        self._applied = {}
+        self._in_flight = set()
+    
+    def _codes(self, category_id):
+        codes = self._categories.get(category_id)
+        if codes is not None:
+            return codes
+        with self._load_lock:
+            codes = self._categories.get(category_id)
+            if codes is not None:
+                return codes
+            with self._lock:
+                self._pending[category_id] = []
+            try:
+                codes = self._load(category_id)
+            finally:
+                with self._lock:
+                    pending = self._pending.pop(category_id)
+            with self._lock:
+                if pending is not None:
+                    self._categories[category_id] = codes
+                    for write in pending:
+                        self._apply_write(*write)
+            return codes
+    
+    def _load(self, category_id):
+        """Read one category's runs on a separate connection (committed data only)"""
+        columns = StockEntry.__table__.c
+        query = db.select(columns.ticket_code, columns.start_value, columns.end_value, columns.entry_date,
+                          columns.id, columns.number_width).where(columns.category_id == category_id)
+        grouped = {}
+        with db.engine.connect() as connection:
+            for code, start, end, entry_date, stock_id, width in connection.execute(query):
+                grouped.setdefault(code or '', []).append(StockRun(start, end, entry_date, stock_id, width))
+        return {code: TicketRuns(runs) for code, runs in grouped.items()}
+    
+    def covering(self, category_id, ticket_code, start, end, as_of=None):
+        """Runs of one category/code holding start..end without a gap, or None"""
+        codes = self._codes(category_id)
+        with self._lock:
+            runs = codes.get(ticket_code or '')
+            return runs.covering(start, end, as_of) if runs else None
+    
+    def covering_codes(self, category_id, start, end, as_of=None):
+        """{ticket_code: runs} for every code of the category that holds start..end without a gap"""
+        codes = self._codes(category_id)
+        with self._lock:
+            result = {}
+            for code, runs in codes.items():
+                lots = runs.covering(start, end, as_of)
+                if lots:
+                    result[code] = lots
+            return result
+    
+    def available(self, category_id, ticket_code, start, end, as_of=None):
+        """{ticket_code: [(start, end)]} of the available sub-ranges in start..end, for one code or all"""
+        codes = self._codes(category_id)
+        with self._lock:
+            selected = codes.items() if ticket_code is None else [(ticket_code or '', codes.get(ticket_code or ''))]
+            result = {}
+            for code, runs in selected:
+                pieces = runs.available(start, end, as_of) if runs else []
+                if pieces or ticket_code is not None:
+                    result[code] = pieces
+            return result
+    
+    def apply(self, writes):
+        """Patch the index with committed [(sequence, stock_id, old values, new values)]"""
+        with self._lock:
+            for write in writes:
+                for category_id in {values['category_id'] for values in write[2:] if values}:
+                    pending = self._pending.get(category_id)
+                    if pending is not None:
+                        pending.append(write)
+                self._apply_write(*write)
+    
+    def _apply_write(self, sequence, stock_id, old, new):
+        # Removing and adding are idempotent, so a write may also be replayed onto a fresh load
+        if old is not None:
+            runs = self._categories.get(old['category_id'], {}).get(old['ticket_code'] or '')
+            if runs is not None:
+                runs.remove(StockRun(old['start_value'], old['end_value'], old['entry_date'],
+                                     stock_id, old['number_width']))
+        if self._applied.get(stock_id, -1) > sequence:
+            return
+        self._applied[stock_id] = sequence
+        if new is not None:
+            codes = self._categories.get(new['category_id'])
+            if codes is not None:
+                codes.setdefault(new['ticket_code'] or '', TicketRuns()).add(
+                    StockRun(new['start_value'], new['end_value'], new['entry_date'], stock_id, new['number_width']))
+    
+    def begin_write(self, sequence):
+        """Note a flushed stock write whose transaction has not ended yet"""
+        with self._lock:
+            self._in_flight.add(sequence)
+    
+    def end_writes(self, sequences):
+        """Forget the applied sequences no write still in flight can be older than"""
+        with self._lock:
+            self._in_flight.difference_update(sequences)
+            # A load replays its pending writes against _applied, so keep it until then
+            if any(pending is not None for pending in self._pending.values()):
+                return
+            oldest = min(self._in_flight, default=None)
+            if oldest is None:
+                self._applied.clear()
+            else:
+                self._applied = {stock_id: sequence for stock_id, sequence in self._applied.items()
+                                 if sequence > oldest}
+    
+    def clear(self):
+        with self._lock:
+            self._categories.clear()
+            self._applied.clear()
+            for category_id in self._pending:
+                self._pending[category_id] = None
+
+availability_index = AvailabilityIndex()
+_stock_write_sequence = itertools.count(1)
+
+# Load the previous range whenever it is set, so the old run can be found again at commit
+for _field in ('start_value', 'end_value', 'number_width'):
+    event.listen(getattr(StockEntry, _field), 'set', lambda target, value, oldvalue, initiator: None, active_history=True)
+
+def _stock_run_values(entry, committed):
+    """Run-relevant values of a stock entry, as last committed or as just flushed"""
+    values = {}
+    for field in STOCK_RUN_FIELDS:
+        history = attributes.get_history(entry, field)
+        values[field] = history.deleted[0] if committed and history.deleted else getattr(entry, field)
+    return values
+
+@event.listens_for(db.session, 'after_flush')
+def track_stock_runs(session, flush_context):
+    """Queue this flush's stock entry changes for the availability index (applied on commit)"""
+    writes = []
+    for entry in session.deleted:
+        if isinstance(entry, StockEntry):
+            writes.append((entry.id, _stock_run_values(entry, committed=True), None))
+    for entry in session.dirty:
+        if isinstance(entry, StockEntry) and session.is_modified(entry):
+            writes.append((entry.id, _stock_run_values(entry, committed=True), _stock_run_values(entry, committed=False)))
+    for entry in session.new:
+        if isinstance(entry, StockEntry):
+            writes.append((entry.id, None, _stock_run_values(entry, committed=False)))
+    if writes:
+        # Numbered while this transaction holds the write lock, so conflicting writes are ordered
+        sequence = next(_stock_write_sequence)
+        availability_index.begin_write(sequence)
+        session.info.setdefault('stock_sequences', []).append(sequence)
+        session.info.setdefault('stock_runs', []).extend((sequence, *write) for write in writes)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_stock_statements(orm_execute_state):
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.statement.table.name == StockEntry.__table__.name:
+        orm_execute_state.session.info['stock_runs_reset'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def apply_stock_runs(session):
+    writes = session.info.pop('stock_runs', None)
+    if session.info.pop('stock_runs_reset', False):
+        availability_index.clear()
+    elif writes:
+        availability_index.apply(writes)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_stock_runs(session):
+    session.info.pop('stock_runs', None)
+    session.info.pop('stock_runs_reset', None)
+
+@event.listens_for(db.session, 'after_transaction_end')
+def end_stock_writes(session, transaction):
+    # Committed, rolled back or closed: this transaction's writes are no longer in flight
+    if transaction.parent is None:
+        sequences = session.info.pop('stock_sequences', None)
+        if sequences:
+            availability_index.end_writes(sequences)
+
+# Per-table change counters. Each tracked table has a version that is bumped whenever a
+# transaction that wrote to it ends (ORM flushes and Core DML through the session alike).
+# They back the reference data cache below and the ETags of the read APIs. The epoch makes
+# versions from an earlier run of the app distinct. Writes from other processes bump every
+# table (see ExternalWrites).
+TRACKED_TABLES = ('user', 'category', 'distributor', 'party', 'stock_entry', 'sale_entry')
+TABLE_VERSION_EPOCH = os.urandom(4).hex()
+table_versions = {table: 0 for table in TRACKED_TABLES}
+# Bumps run on every request thread's flush/commit/rollback; an increment lost to a race
+# would let two table states share a version
+_table_versions_lock = threading.Lock()
+
+def _bump_table_versions(tables):
+    with _table_versions_lock:
+        for table in tables:
+            table_versions[table] += 1
+
+def _record_table_writes(session, tables):
+    # Bump now and again when the transaction ends, so anything read from uncommitted rows
+    # in between (a cache snapshot, an ETag) is stale on both commit and rollback
+    tables = {table for table in tables if table in table_versions}
+    if tables:
+        session.info.setdefault('table_writes', set()).update(tables)
+        _bump_table_versions(tables)
+
+@event.listens_for(db.session, 'after_flush')
+def track_flushed_writes(session, flush_context):
+    """Record the tracked tables and row ids written by this flush"""
+    changes = session.info.setdefault('changes', {})
+    tables = set()
+    for op, objects in (('created', session.new), ('updated', session.dirty), ('deleted', session.deleted)):
+        for obj in objects:
+            table = obj.__table__.name
+            if table in table_versions and (op != 'updated' or session.is_modified(obj)):
+                changes.setdefault((table, op), set()).add(obj.id)
+                tables.add(table)
+    _record_table_writes(session, tables)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_statement_writes(orm_execute_state):
+    """Record the tracked tables written by INSERT/UPDATE/DELETE statements run through the session"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table.name
+        if table in table_versions:
+            orm_execute_state.session.info.setdefault('changes', {}).setdefault((table, 'changed'), set())
+        _record_table_writes(orm_execute_state.session, {table})
+
+@event.listens_for(db.session, 'after_commit')
+def publish_table_writes(session):
+    _bump_table_versions(session.info.pop('table_writes', ()))
+    changes = session.info.pop('changes', None)
+    if changes:
+        change_feed.publish({'changes': [
+            {'table': table, 'op': op, 'ids': sorted(ids)} for (table, op), ids in sorted(changes.items())
+        ]})
+
+@event.listens_for(db.session, 'after_rollback')
+def release_table_writes(session):
+    _bump_table_versions(session.info.pop('table_writes', ()))
+    session.info.pop('changes', None)
+
+class ChangeFeed:
+    """
+    Fan-out of committed change events to the server-sent event streams.
+    Keeps the most recent events so a reconnecting stream can catch up from its Last-Event-ID;
+    a stream that fell further behind than that is told to resync instead.
+    """
+    def __init__(self, history=256):
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=history)
+        self.last_id = 0
+    
+    def publish(self, payload):
+        with self._condition:
+            self.last_id += 1
+            self._events.append((self.last_id, json.dumps(payload, separators=(',', ':'))))
+            self._condition.notify_all()
+    
+    def wait(self, after_id, timeout):
+        """Events newer than after_id as [(id, data)], blocking up to timeout; None if some were dropped"""
+        with self._condition:
+            if self.last_id <= after_id:
+                self._condition.wait(timeout)
+            if self._events and self._events[0][0] > after_id + 1:
+                return None
+            return [(event_id, data) for event_id, data in self._events if event_id > after_id]
+
+change_feed = ChangeFeed()
+
+# Writes from other processes. The availability index, the table versions behind the ETags and
+# the reference cache only see this process's writes, but the maintenance commands (or a second
+# copy of the app) write to the same lottery.db. Every write transaction therefore also bumps
+# write_counter, and requests compare that counter with the bumps this process made itself; any
+# left over were committed elsewhere, and the per-process state is dropped. The counter is read at
+# most once per EXTERNAL_WRITE_CHECK_SECONDS, so other processes' writes show up within that time
+# and most requests (304 revalidations included) skip the extra SELECT.
+class ExternalWrites:
+    """Tells other processes' bumps of write_counter apart from this process's own"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Own bumps, counted at flush (before they can be seen) and uncounted if not committed,
+        # so the estimate of other processes' writes can lag but never runs ahead
+        self._own = 0
+        self._seen = None
+        self._next_check = 0.0
+    
+    def due(self, interval):
+        """True for the first caller after each `interval` seconds"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return False
+            self._next_check = now + interval
+            return True
+    
+    def count_own(self, delta):
+        with self._lock:
+            self._own += delta
+    
+    def check(self, value):
+        """True when the counter value shows writes by other processes not seen before"""
+        with self._lock:
+            others = value - self._own
+            if self._seen is not None and others <= self._seen:
+                return False
+            changed = self._seen is not None
+            self._seen = others
+            return changed
+
+external_writes = ExternalWrites()
+
+def _count_write(session):
+    # Once per transaction, inside it, so the bump commits or rolls back with the writes
+    if session.info.get('counted_write'):
+        return
+    table = WriteCounter.__table__
+    stmt = sqlite.insert(table).values(id=1, value=1)
+    session.connection().execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.id], set_={'value': table.c.value + 1}))
+    session.info['counted_write'] = True
+    external_writes.count_own(1)
+
+@event.listens_for(db.session, 'after_flush')
+def count_flushed_write(session, flush_context):
+    if session.new or session.dirty or session.deleted:
+        _count_write(session)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def count_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _count_write(orm_execute_state.session)
+
+@event.listens_for(db.session, 'after_commit')
+def keep_counted_write(session):
+    session.info.pop('counted_write', None)
+
+@event.listens_for(db.session, 'after_transaction_end')
+def uncount_write(session, transaction):
+    # Still marked: the transaction ended without committing, so its bump never reached the database
+    if transaction.parent is None and session.info.pop('counted_write', False):
+        external_writes.count_own(-1)
+
+@app.before_request
+def check_external_writes():
+    """Drop the per-process caches when another process has written to the database"""
+    if request.endpoint in ('static', 'change_events'):
+        return
+    if not external_writes.due(app.config['EXTERNAL_WRITE_CHECK_SECONDS']):
+        return
+    value = db.session.execute(db.select(WriteCounter.value).where(WriteCounter.id == 1)).scalar()
+    if external_writes.check(value or 0):
+        logger.info("Database written by another process; reloading stock availability and cached data")
+        availability_index.clear()
+        _bump_table_versions(TRACKED_TABLES)
+        change_feed.publish({'changes': [{'table': table, 'op': 'changed', 'ids': []} for table in TRACKED_TABLES]})
+
+# Reference data cache. Categories, distributors and parties are tiny and read on nearly every
+# request, so lookups are served from immutable per-process snapshots that are reloaded when
+# their table version moves on.
+REFERENCE_MODELS = {'category': Category, 'distributor': Distributor, 'party': Party}
+# Row types are built on first use: reading the mapper's columns configures all mappers, which
+# would otherwise add to startup time before the first request needs it
+REFERENCE_ROW_TYPES = {}
+_reference_snapshots = {}
+
+def _reference_snapshot(table):
+    version = table_versions[table]
+    cached = _reference_snapshots.get(table)
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+    
+    model = REFERENCE_MODELS[table]
+    row_type = REFERENCE_ROW_TYPES.get(table)
+    if row_type is None:
+        row_type = REFERENCE_ROW_TYPES[table] = namedtuple(
+            f'Cached{model.__name__}', [column.key for column in model.__mapper__.column_attrs])
+    columns = [getattr(model, field) for field in row_type._fields]
+    rows = [row_type(*row) for row in db.session.query(*columns).order_by(model.id)]
+    by_id = {row.id: row for row in rows}
+    _reference_snapshots[table] = (version, rows, by_id)
+    return rows, by_id
+
+def reference_rows(table):
+    """All rows of a reference table ('category', 'distributor' or 'party') as cached snapshots"""
+    return _reference_snapshot(table)[0]
+
+def reference_row(table, row_id):
+    """One cached reference row by id, or None"""
+    if row_id is None:
+        return None
+    return _reference_snapshot(table)[1].get(int(row_id))
+
+# Conditional GET for the read APIs
+def conditional_get(*tables, vary=None):
+    """
+    Give GET responses a strong ETag built from the versions of the tables they read (plus
+    vary(), for responses that also depend on the user or the day) and answer a matching
+    If-None-Match with 304 before the view runs. The versions are read before the view, so a
+    write committed mid-request can only make the ETag older than the body, never newer.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            
+            parts = [TABLE_VERSION_EPOCH] + [str(table_versions[table]) for table in tables]
+            if vary:
+                parts.append(str(vary()))
+            etag = '-'.join(parts)
+            if etag in request.if_none_match:
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -164,6 +1153,7 @@ def logout():
 
 @app.route('/api/user-info')
 @login_required
+@conditional_get('user', vary=lambda: current_user.id)
 def user_info():
     return jsonify({
         'username': current_user.username,
@@ -172,6 +1162,7 @@ def user_info():
 
 @app.route('/api/categories', methods=['GET', 'POST'])
 @login_required
+@conditional_get('category')
 def categories():
     if request.method == 'POST':
         if not current_user.is_admin:
@@ -209,7 +1200,7 @@ def categories():
         
         return jsonify({'success': True, 'id': category.id, 'message': 'Category created'})
     
-    categories = Category.query.all()
+    categories = reference_rows('category')
     return jsonify([{
         'id': c.id,
         'name': c.name,
@@ -221,6 +1212,7 @@ def categories():
 
 @app.route('/api/categories/<int:category_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
+@conditional_get('category')
 def manage_category(category_id):
     category = Category.query.get(category_id)
     if not category:
@@ -279,6 +1271,7 @@ def manage_category(category_id):
 # Distributor API endpoints
 @app.route('/api/distributors', methods=['GET', 'POST'])
 @login_required
+@conditional_get('distributor')
 def distributors():
     if request.method == 'POST':
         if not current_user.is_admin:
@@ -300,7 +1293,7 @@ def distributors():
         
         return jsonify({'success': True, 'id': distributor.id, 'message': 'Distributor created'})
     
-    distributors = Distributor.query.all()
+    distributors = reference_rows('distributor')
     return jsonify([{
         'id': d.id,
         'name': d.name
@@ -308,6 +1301,7 @@ def distributors():
 
 @app.route('/api/distributors/<int:distributor_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
+@conditional_get('distributor')
 def manage_distributor(distributor_id):
     distributor = Distributor.query.get(distributor_id)
     if not distributor:
@@ -350,6 +1344,7 @@ def manage_distributor(distributor_id):
 # Party API endpoints
 @app.route('/api/parties', methods=['GET', 'POST'])
 @login_required
+@conditional_get('party')
 def parties():
     if request.method == 'POST':
         if not current_user.is_admin:
@@ -371,7 +1366,7 @@ def parties():
         
         return jsonify({'success': True, 'id': party.id, 'message': 'Party created'})
     
-    parties = Party.query.all()
+    parties = reference_rows('party')
     return jsonify([{
         'id': p.id,
         'name': p.name
@@ -379,6 +1374,7 @@ def parties():
 
 @app.route('/api/parties/<int:party_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
+@conditional_get('party')
 def manage_party(party_id):
     party = Party.query.get(party_id)
     if not party:
@@ -418,14 +1414,12 @@ def manage_party(party_id):
         'name': party.name
     })
 
-# Helper function to check for overlapping ticket ranges
-def check_overlapping_range(category_id, ticket_code, start_num, end_num, exclude_entry_id=None):
+# Helper function to build the stock query for one category/ticket code range index
+def stock_range_query(category_id, ticket_code):
     """
-    Check if a ticket range overlaps with existing entries for the same category and ticket code.
-    Returns the overlapping entry if found, None otherwise.
-    Two ranges [a, b] and [c, d] overlap if: a <= d AND c <= b
+    Return a StockEntry query restricted to one (category_id, ticket_code) pair.
+    A missing ticket code matches only entries without a code.
     """
-    # Get all entries for this category with the same ticket code
     query = StockEntry.query.filter_by(category_id=category_id)
     
     # Filter by ticket code (both must match, including None)
@@ -434,34 +1428,188 @@ def check_overlapping_range(category_id, ticket_code, start_num, end_num, exclud
     else:
         query = query.filter(StockEntry.ticket_code.is_(None))
     
+    return query
+
+# Helper function to check for overlapping ticket ranges
+def check_overlapping_range(category_id, ticket_code, start_num, end_num, exclude_entry_id=None):
+    """
+    Check if a ticket range overlaps with existing entries for the same category and ticket code.
+    Returns the overlapping entry if found, None otherwise.
+    Two ranges [a, b] and [c, d] overlap if: a <= d AND c <= b
+    
+    Stock ranges for a category/code never overlap each other, so the only entry that can
+    overlap [start, end] is the one with the greatest start <= end. That entry is found with
+    a single seek on ix_stock_entry_code_start instead of scanning every row.
+    """
+    query = stock_range_query(category_id, ticket_code)
+    
     # Exclude the current entry if updating
     if exclude_entry_id:
         query = query.filter(StockEntry.id != exclude_entry_id)
     
-    existing_entries = query.all()
-    
     new_start = int(start_num)
     new_end = int(end_num)
     
-    for entry in existing_entries:
-        existing_start = int(entry.start_number)
-        existing_end = int(entry.end_number)
-        
-        # Check for overlap: ranges overlap if new_start <= existing_end AND existing_start <= new_end
-        if new_start <= existing_end and existing_start <= new_end:
-            return entry
+    candidate = query.filter(StockEntry.start_value <= new_end).order_by(StockEntry.start_value.desc()).first()
+    
+    # Check for overlap: ranges overlap if new_start <= existing_end AND existing_start <= new_end
+    if candidate and new_start <= candidate.end_value:
+        return candidate
     
     return None
 
+# Listing queries: one joined SELECT returning plain row tuples (no ORM objects, no per-row lookups)
+def stock_listing_query():
+    """Stock entries with category and distributor names pre-joined, in insertion order"""
+    return db.session.query(
+        StockEntry.id,
+        StockEntry.category_id,
+        Category.name.label('category'),
+        Category.series,
+        Category.denomination,
+        StockEntry.distributor_id,
+        Distributor.name.label('distributor'),
+        StockEntry.entry_date,
+        StockEntry.ticket_code,
+        StockEntry.start_number,
+        StockEntry.end_number,
+        StockEntry.quantity,
+        StockEntry.rate,
+        StockEntry.amount,
+        StockEntry.notes
+    ).outerjoin(Category, Category.id == StockEntry.category_id) \
+     .outerjoin(Distributor, Distributor.id == StockEntry.distributor_id) \
+     .order_by(StockEntry.id)
+
+def sale_listing_query():
+    """Sale entries with category and party names pre-joined, in insertion order"""
+    return db.session.query(
+        SaleEntry.id,
+        SaleEntry.category_id,
+        Category.name.label('category'),
+        Category.series,
+        Category.denomination,
+        SaleEntry.party_id,
+        Party.name.label('party'),
+        SaleEntry.entry_date,
+        SaleEntry.ticket_code,
+        SaleEntry.start_number,
+        SaleEntry.end_number,
+        SaleEntry.quantity,
+        SaleEntry.rate,
+        SaleEntry.amount,
+        SaleEntry.notes
+    ).outerjoin(Category, Category.id == SaleEntry.category_id) \
+     .outerjoin(Party, Party.id == SaleEntry.party_id) \
+     .order_by(SaleEntry.id)
+
+# Listing filters and keyset pagination shared by the stock and sale entry endpoints
+MAX_PAGE_SIZE = 1000
+
+def parse_date_arg(args, name):
+    value = args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def apply_entry_filters(query, model, args):
+    """
+    Apply listing filters from the request args to a stock/sale listing query.
+    Supports date, date_from, date_to, category_id, ticket_code and number_from/number_to
+    (entries whose ticket range overlaps that span). Raises ValueError on malformed values.
+    """
+    entry_date = parse_date_arg(args, 'date')
+    if entry_date:
+        query = query.filter(model.entry_date == entry_date)
+    
+    date_from = parse_date_arg(args, 'date_from')
+    if date_from:
+        query = query.filter(model.entry_date >= date_from)
+    
+    date_to = parse_date_arg(args, 'date_to')
+    if date_to:
+        query = query.filter(model.entry_date <= date_to)
+    
+    if args.get('category_id'):
+        query = query.filter(model.category_id == int(args.get('category_id')))
+    
+    ticket_code = args.get('ticket_code', '').strip().upper()
+    if ticket_code:
+        query = query.filter(model.ticket_code == ticket_code)
+    
+    if args.get('number_from'):
+        query = query.filter(model.end_value >= int(args.get('number_from')))
+    
+    if args.get('number_to'):
+        query = query.filter(model.start_value <= int(args.get('number_to')))
+    
+    return query
+
+def paginate_listing(query, model, args):
+    """
+    Keyset pagination over entry id using the `limit` and `after_id` args.
+    Without `limit` the whole result is returned, as before.
+    Returns (rows, next_after_id); next_after_id is None on the last page.
+    """
+    if args.get('after_id'):
+        query = query.filter(model.id > int(args.get('after_id')))
+    
+    if not args.get('limit'):
+        return query.all(), None
+    
+    limit = max(1, min(int(args.get('limit')), MAX_PAGE_SIZE))
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+def listing_response(result, next_after_id):
+    """JSON array response; the cursor for the next page travels in X-Next-After-Id"""
+    response = jsonify(result)
+    if next_after_id is not None:
+        response.headers['X-Next-After-Id'] = str(next_after_id)
+    return response
+
+def serialize_stock_row(row):
+    return {
+        'id': row.id,
+        'category': row.category or 'Unknown',
+        'category_id': row.category_id,
+        'distributor': row.distributor or '',
+        'distributor_id': row.distributor_id,
+        'date': row.entry_date.strftime('%Y-%m-%d'),
+        'ticket_code': row.ticket_code or '',
+        'start_number': row.start_number,
+        'end_number': row.end_number,
+        'quantity': row.quantity,
+        'rate': row.rate or 0,
+        'amount': row.amount or 0,
+        'notes': row.notes
+    }
+
+def serialize_sale_row(row):
+    return {
+        'id': row.id,
+        'category': row.category or 'Unknown',
+        'category_id': row.category_id,
+        'party': row.party or '',
+        'party_id': row.party_id,
+        'date': row.entry_date.strftime('%Y-%m-%d'),
+        'ticket_code': row.ticket_code or '',
+        'start_number': row.start_number,
+        'end_number': row.end_number,
+        'quantity': row.quantity,
+        'rate': row.rate or 0,
+        'amount': row.amount or 0,
+        'notes': row.notes
+    }
+
 @app.route('/api/stock-entries', methods=['GET', 'POST'])
 @login_required
+@conditional_get('stock_entry', 'category', 'distributor')
 def stock_entries():
     if request.method == 'POST':
         try:
             data = request.get_json()
-            logger.info(f"[STOCK-ENTRY POST] Received data: {data}")
-            logger.info(f"[STOCK-ENTRY POST] Start number type: {type(data.get('start_number'))}, value: {repr(data.get('start_number'))}")
-            logger.info(f"[STOCK-ENTRY POST] End number type: {type(data.get('end_number'))}, value: {repr(data.get('end_number'))}")
+            diagnose('stock_entry.received', data=data)
             
             # Handle distributor_id - can be empty string, None, or a number
             distributor_id = data.get('distributor_id')
@@ -475,10 +1623,11 @@ def stock_entries():
             start_number = data.get('start_number')
             end_number = data.get('end_number')
             
-            # Check for overlapping ranges
+            # Check for overlapping ranges (under the write lock, so no other purchase lands in between)
+            lock_stock_for_write()
             overlapping = check_overlapping_range(category_id, ticket_code, start_number, end_number)
             if overlapping:
-                category = Category.query.get(category_id)
+                category = reference_row('category', category_id)
                 cat_name = category.name if category else 'Unknown'
                 return jsonify({
                     'success': False, 
@@ -502,21 +1651,10 @@ def stock_entries():
                 notes=data.get('notes'),
                 created_by=current_user.id
             )
-            logger.info(f"[STOCK-ENTRY POST] Before commit - Start: {repr(entry.start_number)}, End: {repr(entry.end_number)}")
             
             db.session.add(entry)
             db.session.commit()
-            
-            # Verify immediately after commit
-            logger.info(f"[STOCK-ENTRY POST] VERIFICATION AFTER COMMIT:")
-            logger.info(f"  entry.start_number = {repr(entry.start_number)} (type: {type(entry.start_number).__name__})")
-            logger.info(f"  entry.end_number = {repr(entry.end_number)} (type: {type(entry.end_number).__name__})")
-            
-            # Fetch from database immediately
-            fetched = StockEntry.query.get(entry.id)
-            logger.info(f"[STOCK-ENTRY POST] FETCHED FROM DATABASE:")
-            logger.info(f"  fetched.start_number = {repr(fetched.start_number)} (type: {type(fetched.start_number).__name__})")
-            logger.info(f"  fetched.end_number = {repr(fetched.end_number)} (type: {type(fetched.end_number).__name__})")
+            diagnose('stock_entry.created', id=entry.id, start_number=entry.start_number, end_number=entry.end_number)
             
             return jsonify({'success': True, 'id': entry.id, 'message': 'Stock entry created'})
         except Exception as e:
@@ -524,47 +1662,26 @@ def stock_entries():
             db.session.rollback()
             return jsonify({'success': False, 'message': str(e)}), 500
     
-    # Get all entries or filter by date and distributor
-    date_filter = request.args.get('date')
+    # Get all entries or one page, filtered by date, distributor, category, code and number range
     distributor_id_filter = request.args.get('distributor_id')
-    query = StockEntry.query
-    
-    if date_filter:
-        query = query.filter_by(entry_date=datetime.strptime(date_filter, '%Y-%m-%d').date())
-    
-    if distributor_id_filter:
-        query = query.filter_by(distributor_id=int(distributor_id_filter))
-    
-    entries = query.all()
-    logger.info(f"[STOCK-ENTRY GET] Retrieved {len(entries)} entries")
-    
-    result = []
-    for e in entries:
-        logger.info(f"[STOCK-ENTRY GET] Entry ID {e.id} - Start: {repr(e.start_number)}, End: {repr(e.end_number)}")
-        category = Category.query.get(e.category_id)
-        distributor = Distributor.query.get(e.distributor_id) if e.distributor_id else None
-        result.append({
-            'id': e.id,
-            'category': category.name if category else 'Unknown',
-            'category_id': e.category_id,
-            'distributor': distributor.name if distributor else '',
-            'distributor_id': e.distributor_id,
-            'date': e.entry_date.strftime('%Y-%m-%d'),
-            'ticket_code': e.ticket_code or '',
-            'start_number': e.start_number,
-            'end_number': e.end_number,
-            'quantity': e.quantity,
-            'rate': e.rate or 0,
-            'amount': e.amount or 0,
-            'notes': e.notes
-        })
+    try:
+        query = apply_entry_filters(stock_listing_query(), StockEntry, request.args)
+        
+        if distributor_id_filter:
+            query = query.filter(StockEntry.distributor_id == int(distributor_id_filter))
+        
+        rows, next_after_id = paginate_listing(query, StockEntry, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid filter: {e}'}), 400
     
-    logger.info(f"[STOCK-ENTRY GET] Returning {len(result)} entries to frontend")
-    return jsonify(result)
+    result = [serialize_stock_row(row) for row in rows]
+    diagnose('stock_entry.listed', count=len(result), next_after_id=next_after_id, args=request.args.to_dict())
+    return listing_response(result, next_after_id)
 
 @app.route('/api/stock-entries/<int:entry_id>', methods=['PUT', 'DELETE'])
 @login_required
 def manage_stock_entry(entry_id):
+    lock_stock_for_write()
     entry = StockEntry.query.get(entry_id)
     if not entry:
         return jsonify({'success': False, 'message': 'Entry not found'}), 404
@@ -589,7 +1706,7 @@ def manage_stock_entry(entry_id):
         # Check for overlapping ranges (exclude current entry)
         overlapping = check_overlapping_range(category_id, ticket_code, start_number, end_number, exclude_entry_id=entry_id)
         if overlapping:
-            category = Category.query.get(category_id)
+            category = reference_row('category', category_id)
             cat_name = category.name if category else 'Unknown'
             return jsonify({
                 'success': False, 
@@ -614,6 +1731,253 @@ def manage_stock_entry(entry_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 400
 
+# Bulk purchase import: many ranges validated in one sorted sweep, inserted with executemany,
+# committed once. The whole batch is rejected if any row fails.
+
+# CSV headers accepted besides the JSON field names (matches the purchase CSV export)
+IMPORT_FIELD_ALIASES = {
+    'date': 'entry_date',
+    'code': 'ticket_code',
+    'start': 'start_number',
+    'end': 'end_number'
+}
+
+def normalize_import_row(raw):
+    """Lower-case/underscore the keys of an import row and map CSV header aliases"""
+    row = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        key = key.strip().lower().replace(' ', '_')
+        row[IMPORT_FIELD_ALIASES.get(key, key)] = value.strip() if isinstance(value, str) else value
+    return row
+
+def parse_import_file(data, filename=''):
+    """Parse an uploaded import file (JSON array / {"entries": [...]} or CSV with a header row)"""
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if filename.lower().endswith('.json') or text.lstrip().startswith(('[', '{')):
+        payload = json.loads(text)
+        return payload.get('entries', []) if isinstance(payload, dict) else payload
+    return list(csv.DictReader(io.StringIO(text)))
+
+def import_stock_entries(raw_rows, user_id, defaults=None):
+    """
+    Validate and insert a batch of purchase ranges.
+    Each row needs start_number/end_number and a category (category_id or name), plus
+    entry_date/distributor unless given in `defaults`. quantity defaults to tickets x
+    denomination and rate to the category purchase rate.
+    Returns (inserted_count, errors) where errors is a list of {'row', 'message'};
+    nothing is written unless errors is empty.
+    """
+    defaults = defaults or {}
+    categories = reference_rows('category')
+    categories_by_id = {c.id: c for c in categories}
+    categories_by_name = {c.name.upper(): c for c in categories}
+    distributors = reference_rows('distributor')
+    distributors_by_id = {d.id: d for d in distributors}
+    distributors_by_name = {d.name.upper(): d for d in distributors}
+    
+    errors = []
+    parsed = []
+    
+    # 1. Parse and validate each row on its own
+    for row_number, raw in enumerate(raw_rows, 1):
+        if not isinstance(raw, dict):
+            errors.append({'row': row_number, 'message': 'Row must be an object'})
+            continue
+        row = dict(defaults)
+        row.update({k: v for k, v in normalize_import_row(raw).items() if v not in (None, '')})
+        try:
+            if row.get('category_id'):
+                category = categories_by_id.get(int(row['category_id']))
+            else:
+                category = categories_by_name.get(str(row.get('category', '')).upper())
+            if not category:
+                raise ValueError(f"Unknown category {row.get('category_id') or row.get('category') or '(missing)'}")
+            
+            distributor_id = None
+            if row.get('distributor_id'):
+                distributor = distributors_by_id.get(int(row['distributor_id']))
+                if not distributor:
+                    raise ValueError(f"Unknown distributor id {row['distributor_id']}")
+                distributor_id = distributor.id
+            elif row.get('distributor'):
+                distributor = distributors_by_name.get(str(row['distributor']).upper())
+                if not distributor:
+                    raise ValueError(f"Unknown distributor {row['distributor']}")
+                distributor_id = distributor.id
+            
+            if not row.get('entry_date'):
+                raise ValueError('Missing entry_date')
+            entry_date = datetime.strptime(str(row['entry_date']), '%Y-%m-%d').date()
+            
+            start_number = str(row.get('start_number', ''))
+            end_number = str(row.get('end_number', ''))
+            if not start_number.isdigit() or not end_number.isdigit():
+                raise ValueError('start_number and end_number must be numeric')
+            # Short end numbers take their prefix from the start number (as in the entry form)
+            if len(end_number) < len(start_number):
+                end_number = start_number[:len(start_number) - len(end_number)] + end_number
+            start_value, end_value = int(start_number), int(end_number)
+            if end_value < start_value:
+                raise ValueError(f'End number {end_number} is before start number {start_number}')
+            
+            denomination = int(category.denomination) if category.denomination.isdigit() else 1
+            quantity = int(row['quantity']) if row.get('quantity') else (end_value - start_value + 1) * denomination
+            rate = float(row['rate']) if row.get('rate') else (category.purchase_rate or 0)
+        except (ValueError, TypeError) as e:
+            errors.append({'row': row_number, 'message': str(e)})
+            continue
+        
+        parsed.append({
+            'row': row_number,
+            'category_id': category.id,
+            'category_name': category.name,
+            'distributor_id': distributor_id,
+            'entry_date': entry_date,
+            'ticket_code': str(row.get('ticket_code', '')).strip().upper() or None,
+            'start_number': start_number,
+            'end_number': end_number,
+            'start_value': start_value,
+            'end_value': end_value,
+            'number_width': len(start_number),
+            'quantity': quantity,
+            'rate': rate,
+            'amount': rate * quantity,
+            'notes': row.get('notes'),
+            'created_by': user_id
+        })
+    
+    # 2. One sorted sweep per category/code: batch rows against each other and against stock,
+    # holding the write lock from here to the commit so the stock checked is the stock written to
+    lock_stock_for_write()
+    groups = {}
+    for entry in parsed:
+        groups.setdefault((entry['category_id'], entry['ticket_code']), []).append(entry)
+    
+    for (category_id, ticket_code), batch in groups.items():
+        batch.sort(key=lambda e: e['start_value'])
+        code_label = ticket_code or 'no code'
+        
+        # Compare each row with the row reaching furthest so far, which a nested row does not replace
+        widest = batch[0]
+        for entry in batch[1:]:
+            if entry['start_value'] <= widest['end_value']:
+                errors.append({'row': entry['row'], 'message': (
+                    f"Range {entry['start_number']}-{entry['end_number']} overlaps row {widest['row']} "
+                    f"({widest['start_number']}-{widest['end_number']}) for {entry['category_name']} ({code_label})")})
+            if entry['end_value'] > widest['end_value']:
+                widest = entry
+        
+        # Existing stock that can touch the batch span: the predecessor of the lowest start onwards
+        low, high = batch[0]['start_value'], max(e['end_value'] for e in batch)
+        query = stock_range_query(category_id, ticket_code)
+        predecessor = query.filter(StockEntry.start_value <= low).order_by(StockEntry.start_value.desc()).first()
+        span_start = predecessor.start_value if predecessor else low
+        existing = query.filter(StockEntry.start_value >= span_start, StockEntry.start_value <= high) \
+                        .order_by(StockEntry.start_value).all()
+        
+        i = j = 0
+        while i < len(batch) and j < len(existing):
+            entry, stock = batch[i], existing[j]
+            if entry['end_value'] < stock.start_value:
+                i += 1
+            elif stock.end_value < entry['start_value']:
+                j += 1
+            else:
+                errors.append({'row': entry['row'], 'message': (
+                    f"Overlapping range exists for {entry['category_name']} ({code_label}): "
+                    f"{stock.start_number} - {stock.end_number}")})
+                i += 1
+    
+    if errors:
+        errors.sort(key=lambda e: e['row'])
+        return 0, errors
+    
+    # 3. Insert everything with one executemany and fold the totals into stock_balance
+    if parsed:
+        columns = set(StockEntry.__table__.columns.keys())
+        db.session.execute(StockEntry.__table__.insert(), [
+            {k: v for k, v in entry.items() if k in columns} for entry in parsed
+        ])
+        deltas = {}
+        for entry in parsed:
+            _add_balance_delta(deltas, entry, 1)
+        apply_stock_balance_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    return len(parsed), []
+
+@app.route('/api/stock-entries/import', methods=['POST'])
+@login_required
+def import_stock_entries_api():
+    """
+    Bulk purchase import. Accepts a JSON array (or {"entries": [...], "entry_date", "distributor_id"})
+    or a CSV upload in the `file` field / raw text/csv body. Query args entry_date and
+    distributor_id act as defaults for rows that omit them.
+    """
+    defaults = {k: request.args[k] for k in ('entry_date', 'distributor_id') if request.args.get(k)}
+    try:
+        if request.is_json:
+            payload = request.get_json()
+            if isinstance(payload, dict):
+                defaults.update({k: payload[k] for k in ('entry_date', 'distributor_id') if payload.get(k)})
+                raw_rows = payload.get('entries', [])
+            else:
+                raw_rows = payload
+        elif 'file' in request.files:
+            upload = request.files['file']
+            raw_rows = parse_import_file(upload.read(), upload.filename or '')
+        else:
+            raw_rows = parse_import_file(request.get_data())
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Could not read import file: {e}'}), 400
+    if not isinstance(raw_rows, list):
+        return jsonify({'success': False, 'message': 'Import must be a list of rows'}), 400
+    
+    try:
+        inserted, errors = import_stock_entries(raw_rows, current_user.id, defaults)
+    except Exception as e:
+        logger.error(f"[STOCK-IMPORT] Error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    if errors:
+        return jsonify({
+            'success': False,
+            'message': f'{len(errors)} of {len(raw_rows)} rows failed validation; nothing was imported',
+            'errors': errors
+        }), 400
+    return jsonify({'success': True, 'imported': inserted, 'message': f'{inserted} stock entries imported'})
+
+@app.cli.command('import-purchases')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', default='admin', show_default=True, help='User recorded as creator')
+@click.option('--date', 'entry_date', help='Default entry date (YYYY-MM-DD) for rows without one')
+@click.option('--distributor', help='Default distributor name for rows without one')
+def import_purchases_command(path, username, entry_date, distributor):
+    """Import a CSV/JSON distributor delivery file as stock entries (all or nothing)."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f'User {username} not found')
+    
+    defaults = {}
+    if entry_date:
+        defaults['entry_date'] = entry_date
+    if distributor:
+        defaults['distributor'] = distributor
+    
+    with open(path, 'rb') as f:
+        raw_rows = parse_import_file(f.read(), path)
+    if not isinstance(raw_rows, list):
+        raise click.ClickException('Import must be a list of rows')
+    
+    inserted, errors = import_stock_entries(raw_rows, user.id, defaults)
+    for error in errors:
+        click.echo(f"Row {error['row']}: {error['message']}", err=True)
+    if errors:
+        raise click.ClickException(f'{len(errors)} of {len(raw_rows)} rows failed validation; nothing was imported')
+    click.echo(f'{inserted} stock entries imported')
+
 # API endpoint to check stock availability and find matching codes for a ticket range
 @app.route('/api/check-stock-range', methods=['POST'])
 @login_required
@@ -631,30 +1995,46 @@ def check_stock_range():
     
     new_start = int(start_num)
     new_end = int(end_num)
+    sale_date = datetime.strptime(sale_date_str, '%Y-%m-%d').date() if sale_date_str else None
     
-    # Get stock entries for this category, filtered by date if provided
-    stock_query = StockEntry.query.filter_by(category_id=category_id)
-    
-    if sale_date_str:
-        sale_date = datetime.strptime(sale_date_str, '%Y-%m-%d').date()
-        stock_query = stock_query.filter(StockEntry.entry_date <= sale_date)
-    
-    stock_entries = stock_query.all()
-    
-    # Find all stock entries that contain the requested range
+    # Per ticket code, the touching lots that hold the whole range (usually just one)
     matching_entries = []
-    for stock in stock_entries:
-        stock_start = int(stock.start_number)
-        stock_end = int(stock.end_number)
-        
-        # Check if requested range is fully contained within this stock entry
-        if new_start >= stock_start and new_end <= stock_end:
+    if app.config['AVAILABILITY_INDEX']:
+        # One bisect per ticket code of the category
+        for code, lots in sorted(availability_index.covering_codes(category_id, new_start, new_end, sale_date).items()):
             matching_entries.append({
-                'id': stock.id,
-                'ticket_code': stock.ticket_code or '',
-                'start_number': stock.start_number,
-                'end_number': stock.end_number
+                'id': lots[0].stock_id,
+                'ticket_code': code,
+                'start_number': format_ticket_number(lots[0].start, lots[0].width),
+                'end_number': format_ticket_number(lots[-1].end, lots[-1].width),
+                'lots': len(lots)
             })
+    else:
+        # Get stock entries for this category, filtered by date if provided
+        stock_query = StockEntry.query.filter_by(category_id=category_id)
+        
+        if sale_date:
+            stock_query = stock_query.filter(StockEntry.entry_date <= sale_date)
+        
+        # Find all stock entries that overlap the requested range, per code in ticket order
+        stock_entries = stock_query.filter(
+            StockEntry.start_value <= new_end,
+            StockEntry.end_value >= new_start
+        ).order_by(StockEntry.ticket_code, StockEntry.start_value).all()
+        
+        by_code = {}
+        for stock in stock_entries:
+            by_code.setdefault(stock.ticket_code or '', []).append(stock)
+        for code, lots in sorted(by_code.items()):
+            covered = covering_lots(lots, new_start, new_end)
+            if covered is not None:
+                matching_entries.append({
+                    'id': lots[covered[0]].id,
+                    'ticket_code': code,
+                    'start_number': lots[covered[0]].start_number,
+                    'end_number': lots[covered[-1]].end_number,
+                    'lots': len(covered)
+                })
     
     if len(matching_entries) == 0:
         return jsonify({
@@ -677,39 +2057,275 @@ def check_stock_range():
             'matches': matching_entries
         })
 
-# Helper function to check if ticket range is available in stock and return the matching stock entry
-def find_stock_entry_for_range(category_id, ticket_code, start_num, end_num, sale_date=None):
+@app.route('/api/stock-availability')
+@login_required
+def stock_availability():
     """
-    Find the stock entry that contains the given ticket range.
-    If sale_date is provided, only considers stock purchased on or before that date.
-    Returns the stock entry if found, None otherwise.
+    Available and missing sub-ranges of a ticket span per ticket code.
+    Query: category_id, start_number, end_number, optional ticket_code (only that code) and
+    date (only stock purchased on or before it).
     """
-    new_start = int(start_num)
-    new_end = int(end_num)
-    
-    # Get all stock entries for this category and ticket code
-    stock_query = StockEntry.query.filter_by(category_id=category_id)
-    if ticket_code:
-        stock_query = stock_query.filter_by(ticket_code=ticket_code)
+    try:
+        category_id = int(request.args['category_id'])
+        start_number = request.args['start_number'].strip()
+        end_number = request.args['end_number'].strip()
+        start, end = int(start_number), int(end_number)
+        as_of = parse_date_arg(request.args, 'date')
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'category_id, start_number and end_number are required'}), 400
+    if start > end:
+        return jsonify({'success': False, 'message': 'Start number must not be after end number'}), 400
+    # Normalised like the listings' filter; blank means every code
+    ticket_code = request.args.get('ticket_code', '').strip().upper() or None
+    width = len(start_number)
+    
+    if app.config['AVAILABILITY_INDEX']:
+        available = availability_index.available(category_id, ticket_code, start, end, as_of)
     else:
-        stock_query = stock_query.filter(StockEntry.ticket_code.is_(None))
-    
-    # Filter by date - only stock purchased on or before sale date
+        query = StockEntry.query.filter_by(category_id=category_id) if ticket_code is None \
+            else stock_range_query(category_id, ticket_code)
+        query = query.filter(StockEntry.start_value <= end, StockEntry.end_value >= start)
+        if as_of:
+            query = query.filter(StockEntry.entry_date <= as_of)
+        grouped = {} if ticket_code is None else {ticket_code: []}
+        for entry in query:
+            grouped.setdefault(entry.ticket_code or '', []).append(
+                StockRun(entry.start_value, entry.end_value, entry.entry_date, entry.id, entry.number_width))
+        available = {code: TicketRuns(runs).available(start, end) for code, runs in grouped.items()}
+    
+    def ranges(pieces):
+        return [{
+            'start_number': format_ticket_number(piece_start, width),
+            'end_number': format_ticket_number(piece_end, width),
+            'tickets': piece_end - piece_start + 1
+        } for piece_start, piece_end in pieces]
+    
+    codes = []
+    for code, pieces in sorted(available.items()):
+        missing = []
+        position = start
+        for piece_start, piece_end in pieces:
+            if piece_start > position:
+                missing.append((position, piece_start - 1))
+            position = piece_end + 1
+        if position <= end:
+            missing.append((position, end))
+        codes.append({
+            'ticket_code': code,
+            'fully_available': not missing,
+            'available': ranges(pieces),
+            'missing': ranges(missing)
+        })
+    return jsonify({'success': True, 'category_id': category_id, 'codes': codes})
+
+# Helper function to read the stock lots that can hold a ticket range
+def stock_lots_query(category_id, ticket_code, start_value, end_value, sale_date=None):
+    """
+    Stock lots of one category/code that can hold start_value..end_value, ordered by start: the
+    lot with the greatest start <= start_value plus every lot starting inside the range. If
+    sale_date is provided, only stock purchased on or before that date is considered.
+    This is one statement; the predecessor is a scalar subquery, and both parts are seeks on
+    ix_stock_entry_code_start.
+    """
+    query = stock_range_query(category_id, ticket_code)
     if sale_date:
-        stock_query = stock_query.filter(StockEntry.entry_date <= sale_date)
-    
-    stock_entries = stock_query.all()
+        query = query.filter(StockEntry.entry_date <= sale_date)
+    predecessor = query.with_entities(db.func.max(StockEntry.start_value)) \
+        .filter(StockEntry.start_value <= start_value).scalar_subquery()
+    return query.filter(StockEntry.start_value >= db.func.coalesce(predecessor, start_value),
+                        StockEntry.start_value <= end_value).order_by(StockEntry.start_value)
+
+def covering_lots(lots, start_value, end_value, first=0):
+    """
+    Positions in `lots` (sorted by start, disjoint) of the contiguous lots that together hold
+    start_value..end_value, searching from lots[first]; None when any ticket is missing.
+    """
+    i = first
+    while i < len(lots) and lots[i].end_value < start_value:
+        i += 1
+    covered = []
+    position = start_value
+    while i < len(lots) and lots[i].start_value <= position:
+        covered.append(i)
+        if lots[i].end_value >= end_value:
+            return covered
+        position = lots[i].end_value + 1
+        i += 1
+    return None
+
+# Stock coalescing. A lot is one purchase: the row created for it plus the fragments that sales
+# split off it, which carry its id in origin_id. Touching rows of the same lot (and the same
+# details) are merged back whenever a restore makes them contiguous, so each lot stays a normalized
+# set of disjoint ranges; the optional compaction job merges any that remain. Rows of different
+# purchases are never merged, so every purchase keeps its own id and can be deleted on its own.
+STOCK_LOT_KEY = ('category_id', 'ticket_code', 'distributor_id', 'rate', 'entry_date', 'notes', 'number_width')
+
+def stock_lot_key(entry):
+    return (entry.lot_id,) + tuple(getattr(entry, field) for field in STOCK_LOT_KEY)
+
+def _merge_stock_entries(left, right):
+    """
+    Merge two touching rows of one lot (right starting at left.end_value + 1) and delete one of
+    them. The purchase row itself always survives, so its id stays valid; returns the survivor.
+    """
+    quantity = (left.quantity or 0) + (right.quantity or 0)
+    amount = (left.amount or 0) + (right.amount or 0)
+    if right.origin_id is None:
+        right.start_number = left.start_number
+        survivor, removed = right, left
+    else:
+        left.end_number = right.end_number
+        survivor, removed = left, right
+    survivor.quantity = quantity
+    survivor.amount = amount
+    db.session.delete(removed)
+    return survivor
+
+def coalesce_stock_entry(entry):
+    """Merge a stock entry with touching neighbours of the same lot key; returns the surviving entry"""
+    query = stock_range_query(entry.category_id, entry.ticket_code)
+    
+    left = query.filter(StockEntry.start_value < entry.start_value).order_by(StockEntry.start_value.desc()).first()
+    if left and left.end_value == entry.start_value - 1 and stock_lot_key(left) == stock_lot_key(entry):
+        entry = _merge_stock_entries(left, entry)
+    
+    right = query.filter(StockEntry.start_value == entry.end_value + 1).first()
+    if right and stock_lot_key(right) == stock_lot_key(entry):
+        entry = _merge_stock_entries(entry, right)
+    return entry
+
+# Threads of this process queue for stock writes on a lock instead of SQLite's busy handler,
+# which polls with sleeps of up to 100 ms and stretches the tail latency under contention
+_stock_write_lock = threading.Lock()
+
+def lock_stock_for_write():
+    """
+    Begin the session's transaction by taking SQLite's write lock (a no-op UPDATE), so stock rows
+    read afterwards cannot be changed by another writer before this transaction ends
+    """
+    from sqlalchemy import text
+    if not db.session.info.get('stock_write_lock'):
+        _stock_write_lock.acquire()
+        db.session.info['stock_write_lock'] = True
+    db.session.execute(text('UPDATE stock_entry SET id = id WHERE 0'))
+
+@event.listens_for(db.session, 'after_transaction_end')
+def release_stock_write_lock(session, transaction):
+    if transaction.parent is None and session.info.pop('stock_write_lock', False):
+        _stock_write_lock.release()
+
+def compact_stock_group(category_id, ticket_code):
+    """
+    Merge every run of touching same-key rows in one category/code; returns rows removed.
+    The caller holds the write lock (lock_stock_for_write) from before the read until it commits,
+    otherwise a sale committed in between would be overwritten by the merge.
+    """
+    merged = 0
+    previous = None
+    for entry in stock_range_query(category_id, ticket_code).order_by(StockEntry.start_value).all():
+        if previous and previous.end_value == entry.start_value - 1 and stock_lot_key(previous) == stock_lot_key(entry):
+            previous = _merge_stock_entries(previous, entry)
+            merged += 1
+        else:
+            previous = entry
+    return merged
+
+def _stock_fragment_rows():
+    """Subquery of stock rows flagged 1 when they touch a same-key predecessor (a mergeable fragment)"""
+    window = {'partition_by': (StockEntry.category_id, StockEntry.ticket_code), 'order_by': StockEntry.start_value}
+    lot_id = db.func.coalesce(StockEntry.origin_id, StockEntry.id)
+    same_key = [db.func.lag(column).over(**window).is_not_distinct_from(column)
+                for column in [lot_id] + [getattr(StockEntry, field) for field in STOCK_LOT_KEY[2:]]]
+    touching = db.func.lag(StockEntry.end_value).over(**window) == StockEntry.start_value - 1
+    return db.session.query(
+        StockEntry.category_id.label('category_id'),
+        StockEntry.ticket_code.label('ticket_code'),
+        case((and_(touching, *same_key), 1), else_=0).label('mergeable')
+    ).subquery()
+
+def stock_fragment_metrics():
+    """Per category: stock rows, category/code groups and mergeable fragments, as {category_id: {...}}"""
+    rows = _stock_fragment_rows()
+    metrics = db.session.query(
+        rows.c.category_id,
+        db.func.count(),
+        db.func.count(db.distinct(db.func.coalesce(rows.c.ticket_code, ''))),
+        db.func.sum(rows.c.mergeable)
+    ).group_by(rows.c.category_id).all()
+    return {category_id: {
+        'category': getattr(reference_row('category', category_id), 'name', 'Unknown'),
+        'rows': count,
+        'groups': groups,
+        'mergeable': int(mergeable or 0)
+    } for category_id, count, groups, mergeable in metrics}
+
+def compact_stock():
+    """
+    Defragment all stock: merge touching same-key rows, committing one category/code at a time so
+    the write lock is only held briefly. Returns (metrics before, metrics after, rows removed).
+    """
+    before = stock_fragment_metrics()
+    rows = _stock_fragment_rows()
+    groups = db.session.query(rows.c.category_id, rows.c.ticket_code) \
+        .group_by(rows.c.category_id, rows.c.ticket_code).having(db.func.sum(rows.c.mergeable) > 0).all()
     
-    # Find the stock entry that fully contains the requested range
-    for stock in stock_entries:
-        stock_start = int(stock.start_number)
-        stock_end = int(stock.end_number)
-        
-        # Check if requested range is fully contained within this stock entry
-        if new_start >= stock_start and new_end <= stock_end:
-            return stock
+    removed = 0
+    for category_id, ticket_code in groups:
+        db.session.commit()
+        lock_stock_for_write()
+        removed += compact_stock_group(category_id, ticket_code)
+        db.session.commit()
+    return before, stock_fragment_metrics(), removed
+
+def start_stock_compactor(interval):
+    """Run compact_stock() every `interval` seconds in a daemon thread (0 disables it)"""
+    if interval <= 0:
+        return None
+    
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    before, after, removed = compact_stock()
+                    if removed:
+                        logger.info(f"Stock compaction merged {removed} fragments")
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"[STOCK-COMPACT] Error: {str(e)}")
+    
+    thread = threading.Thread(target=run, name='stock-compactor', daemon=True)
+    thread.start()
+    return thread
+
+@app.cli.command('stock-compact')
+@click.option('--dry-run', is_flag=True, help='Only report fragment metrics.')
+def stock_compact_command(dry_run):
+    """Merge stock fragments and report rows/mergeable fragments per category before and after."""
+    if dry_run:
+        before, after, removed = stock_fragment_metrics(), None, 0
+    else:
+        before, after, removed = compact_stock()
+    
+    for category_id, metrics in sorted(before.items()):
+        line = f"{metrics['category']}: {metrics['rows']} rows, {metrics['mergeable']} mergeable fragments"
+        if after is not None:
+            remaining = after.get(category_id, {'rows': 0, 'mergeable': 0})
+            line += f" -> {remaining['rows']} rows, {remaining['mergeable']} mergeable"
+        click.echo(line)
+    click.echo(f'{removed} fragments merged')
+
+@app.route('/api/admin/stock-fragments', methods=['GET', 'POST'])
+@login_required
+def admin_stock_fragments():
+    """Fragment metrics per category; POST also runs the compaction and returns before/after"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
     
-    return None
+    if request.method == 'POST':
+        before, after, removed = compact_stock()
+        return jsonify({'success': True, 'merged': removed, 'before': before, 'after': after})
+    return jsonify({'success': True, 'metrics': stock_fragment_metrics()})
 
 # Helper function to deduct tickets from stock by splitting the stock entry
 def deduct_from_stock(stock_entry, sell_start, sell_end, category):
@@ -717,13 +2333,13 @@ def deduct_from_stock(stock_entry, sell_start, sell_end, category):
     Deduct a ticket range from a stock entry by splitting it.
     Returns list of new stock entries created (for the remaining ranges).
     """
-    stock_start = int(stock_entry.start_number)
-    stock_end = int(stock_entry.end_number)
+    stock_start = stock_entry.start_value
+    stock_end = stock_entry.end_value
     sell_start = int(sell_start)
     sell_end = int(sell_end)
     
     # Preserve leading zeros format
-    num_length = len(stock_entry.start_number)
+    num_length = stock_entry.number_width
     
     new_entries = []
     denomination = int(category.denomination) if category else 1
@@ -738,7 +2354,7 @@ def deduct_from_stock(stock_entry, sell_start, sell_end, category):
     elif sell_start == stock_start:
         # Update the original entry to start after the sold range
         new_start = sell_end + 1
-        stock_entry.start_number = str(new_start).zfill(num_length)
+        stock_entry.start_number = format_ticket_number(new_start, num_length)
         ticket_count = stock_end - new_start + 1
         stock_entry.quantity = ticket_count * denomination
         stock_entry.amount = (stock_entry.rate or 0) * stock_entry.quantity
@@ -748,7 +2364,7 @@ def deduct_from_stock(stock_entry, sell_start, sell_end, category):
     elif sell_end == stock_end:
         # Update the original entry to end before the sold range
         new_end = sell_start - 1
-        stock_entry.end_number = str(new_end).zfill(num_length)
+        stock_entry.end_number = format_ticket_number(new_end, num_length)
         ticket_count = new_end - stock_start + 1
         stock_entry.quantity = ticket_count * denomination
         stock_entry.amount = (stock_entry.rate or 0) * stock_entry.quantity
@@ -758,7 +2374,7 @@ def deduct_from_stock(stock_entry, sell_start, sell_end, category):
     else:
         # Update original entry for the first part (before sold range)
         new_end_first = sell_start - 1
-        stock_entry.end_number = str(new_end_first).zfill(num_length)
+        stock_entry.end_number = format_ticket_number(new_end_first, num_length)
         ticket_count_first = new_end_first - stock_start + 1
         stock_entry.quantity = ticket_count_first * denomination
         stock_entry.amount = (stock_entry.rate or 0) * stock_entry.quantity
@@ -772,188 +2388,352 @@ def deduct_from_stock(stock_entry, sell_start, sell_end, category):
             distributor_id=stock_entry.distributor_id,
             entry_date=stock_entry.entry_date,
             ticket_code=stock_entry.ticket_code,
-            start_number=str(new_start_second).zfill(num_length),
-            end_number=str(stock_end).zfill(num_length),
+            start_number=format_ticket_number(new_start_second, num_length),
+            end_number=format_ticket_number(stock_end, num_length),
             quantity=ticket_count_second * denomination,
             rate=stock_entry.rate,
             amount=(stock_entry.rate or 0) * ticket_count_second * denomination,
             notes=stock_entry.notes,
-            created_by=stock_entry.created_by
+            created_by=stock_entry.created_by,
+            origin_id=stock_entry.lot_id
         )
         db.session.add(new_entry)
         new_entries.append(new_entry)
         
         return new_entries
 
-# Sale Entry API Endpoints
-@app.route('/api/sale-entries', methods=['GET', 'POST'])
-@login_required
-def sale_entries():
-    if request.method == 'POST':
+# Helper function to record which stock lot (and at what cost) a sold range came from
+def new_sale_allocation(lot, start_value, end_value, denomination):
+    """SaleAllocation for tickets start_value..end_value taken from stock entry `lot` (call before deducting)"""
+    return SaleAllocation(
+        start_value=start_value,
+        end_value=end_value,
+        quantity=(end_value - start_value + 1) * denomination,
+        distributor_id=lot.distributor_id,
+        rate=lot.rate or 0,
+        entry_date=lot.entry_date,
+        notes=lot.notes,
+        origin_id=lot.lot_id
+    )
+
+# Helper function to post one or many sale ranges against stock in a single transaction
+def post_sale_ranges(ranges, sale_date, party_id, user_id):
+    """
+    Deduct sale ranges from stock and add their SaleEntry rows, without committing.
+    Ranges are grouped per category/code and sorted; each group's stock lots (purchased on or
+    before sale_date) are read with one ordered query and matched in a single merge pass,
+    following the split remainders as ranges are deducted. A range may span several touching
+    lots; it then gets one allocation per lot.
+    Returns (results, ok): results[i] is {'index', 'success', 'message', 'id'} in input order,
+    where success means the range was saved.
+    The caller commits when ok is True and rolls back otherwise.
+    """
+    lock_stock_for_write()
+    results = [None] * len(ranges)
+    groups = {}
+    
+    # Parse every range first so all errors are reported together
+    for index, data in enumerate(ranges):
+        if not isinstance(data, dict):
+            results[index] = {'index': index, 'success': False, 'message': 'Range must be an object'}
+            continue
         try:
-            data = request.get_json()
-            logger.info(f"[SALE-ENTRY POST] Received data: {data}")
-            
-            # Handle party_id - can be empty string, None, or a number
-            party_id = data.get('party_id')
-            if party_id == '' or party_id is None:
-                party_id = None
-            else:
-                party_id = int(party_id)
-            
             category_id = int(data.get('category_id'))
-            ticket_code = data.get('ticket_code', '').strip().upper() or None
-            start_number = data.get('start_number')
-            end_number = data.get('end_number')
+            start_number = str(data.get('start_number', '')).strip()
+            end_number = str(data.get('end_number', '')).strip()
+            start_value, end_value = int(start_number), int(end_number)
+            if end_value < start_value:
+                raise ValueError(f'End number {end_number} is before start number {start_number}')
+        except (TypeError, ValueError) as e:
+            results[index] = {'index': index, 'success': False, 'message': str(e)}
+            continue
+        
+        ticket_code = str(data.get('ticket_code') or '').strip().upper() or None
+        groups.setdefault((category_id, ticket_code), []).append({
+            'index': index,
+            'data': data,
+            'start_number': start_number,
+            'end_number': end_number,
+            'start_value': start_value,
+            'end_value': end_value
+        })
+    
+    for (category_id, ticket_code), batch in groups.items():
+        category = reference_row('category', category_id)
+        if not category:
+            for item in batch:
+                results[item['index']] = {'index': item['index'], 'success': False, 'message': 'Category not found'}
+            continue
+        
+        batch.sort(key=lambda item: item['start_value'])
+        
+        # Stock lots that can contain the batch: the predecessor of the lowest start onwards
+        low, high = batch[0]['start_value'], max(item['end_value'] for item in batch)
+        lots = stock_lots_query(category_id, ticket_code, low, high, sale_date).all()
+        
+        j = 0
+        previous = None
+        for item in batch:
+            index = item['index']
+            if previous and item['start_value'] <= previous['end_value']:
+                results[index] = {'index': index, 'success': False, 'message': (
+                    f"Tickets {item['start_number']}-{item['end_number']} overlap another range in this sale "
+                    f"({previous['start_number']}-{previous['end_number']})")}
+                continue
+            previous = item
             
-            # Parse the sale date
-            sale_date = datetime.strptime(data.get('entry_date'), '%Y-%m-%d').date()
+            # The range may span several touching lots (e.g. of different purchases)
+            covered = covering_lots(lots, item['start_value'], item['end_value'], j)
+            if covered is None:
+                results[index] = {'index': index, 'success': False, 'message': (
+                    f"Tickets {item['start_number']}-{item['end_number']} are not available in stock for this date. "
+                    f"Stock must be purchased on or before the sale date.")}
+                continue
+            j = covered[-1]
             
-            # Find the stock entry that contains this range (only from stock purchased on or before sale date)
-            stock_entry = find_stock_entry_for_range(category_id, ticket_code, start_number, end_number, sale_date)
-            if not stock_entry:
-                return jsonify({'success': False, 'message': f'Tickets {start_number}-{end_number} are not available in stock for this date. Stock must be purchased on or before the sale date.'}), 400
+            data = item['data']
+            ticket_count = item['end_value'] - item['start_value'] + 1
+            denomination = int(category.denomination) if category.denomination.isdigit() else 1
             
-            # Get category for denomination
-            category = Category.query.get(category_id)
+            # Deduct each lot's part from stock, recording where it came from; a middle split
+            # leaves the remainder in a new lot
+            allocations = []
+            for k in covered:
+                lot = lots[k]
+                low, high = max(lot.start_value, item['start_value']), min(lot.end_value, item['end_value'])
+                allocations.append(new_sale_allocation(lot, low, high, denomination))
+                remainder = deduct_from_stock(lot, low, high, category)
+                if remainder:
+                    lots[k] = remainder[0]
             
-            rate = float(data.get('rate', 0))
-            quantity = int(data.get('quantity', 0))
-            amount = rate * quantity
-            
-            # Deduct from stock (split the stock entry)
-            deduct_from_stock(stock_entry, start_number, end_number, category)
+            rate = float(data['rate']) if data.get('rate') not in (None, '') else (category.sale_rate or 0)
+            quantity = int(data['quantity']) if data.get('quantity') not in (None, '') else ticket_count * denomination
             
             entry = SaleEntry(
                 category_id=category_id,
                 party_id=party_id,
                 entry_date=sale_date,
                 ticket_code=ticket_code,
-                start_number=start_number,
-                end_number=end_number,
+                start_number=item['start_number'],
+                end_number=item['end_number'],
                 quantity=quantity,
                 rate=rate,
-                amount=amount,
+                amount=rate * quantity,
                 notes=data.get('notes'),
-                created_by=current_user.id
+                created_by=user_id,
+                allocations=allocations
             )
-            
             db.session.add(entry)
+            results[index] = {'index': index, 'success': True, 'entry': entry}
+    
+    ok = all(result['success'] for result in results)
+    if ok:
+        db.session.flush()
+    for result in results:
+        entry = result.pop('entry', None)
+        if entry is not None:
+            result['success'] = ok
+            result['id'] = entry.id if ok else None
+            result['message'] = 'Sale entry created' if ok else 'Not saved because other ranges failed'
+    return results, ok
+
+def parse_party_id(value):
+    """Handle party_id - can be empty string, None, or a number"""
+    if value == '' or value is None:
+        return None
+    return int(value)
+
+# Sale Entry API Endpoints
+@app.route('/api/sale-entries', methods=['GET', 'POST'])
+@login_required
+@conditional_get('sale_entry', 'category', 'party')
+def sale_entries():
+    if request.method == 'POST':
+        try:
+            data = request.get_json()
+            diagnose('sale_entry.received', data=data)
+            
+            party_id = parse_party_id(data.get('party_id'))
+            
+            # Parse the sale date
+            sale_date = datetime.strptime(data.get('entry_date'), '%Y-%m-%d').date()
+            
+            # Deduct the range from stock purchased on or before the sale date and add the sale
+            results, ok = post_sale_ranges([data], sale_date, party_id, current_user.id)
+            if not ok:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': results[0]['message']}), 400
+            
             db.session.commit()
             
-            return jsonify({'success': True, 'id': entry.id, 'message': 'Sale entry created'})
+            return jsonify({'success': True, 'id': results[0]['id'], 'message': 'Sale entry created'})
         except Exception as e:
             logger.error(f"[SALE-ENTRY POST] Error: {str(e)}")
             db.session.rollback()
             return jsonify({'success': False, 'message': str(e)}), 500
     
-    # Get all entries or filter by date and party
-    date_filter = request.args.get('date')
+    # Get all entries or one page, filtered by date, party, category, code and number range
     party_id_filter = request.args.get('party_id')
-    query = SaleEntry.query
-    
-    if date_filter:
-        query = query.filter_by(entry_date=datetime.strptime(date_filter, '%Y-%m-%d').date())
-    
-    if party_id_filter:
-        query = query.filter_by(party_id=int(party_id_filter))
-    
-    entries = query.all()
-    
-    result = []
-    for e in entries:
-        category = Category.query.get(e.category_id)
-        party = Party.query.get(e.party_id) if e.party_id else None
-        result.append({
-            'id': e.id,
-            'category': category.name if category else 'Unknown',
-            'category_id': e.category_id,
-            'party': party.name if party else '',
-            'party_id': e.party_id,
-            'date': e.entry_date.strftime('%Y-%m-%d'),
-            'ticket_code': e.ticket_code or '',
-            'start_number': e.start_number,
-            'end_number': e.end_number,
-            'quantity': e.quantity,
-            'rate': e.rate or 0,
-            'amount': e.amount or 0,
-            'notes': e.notes
-        })
+    try:
+        query = apply_entry_filters(sale_listing_query(), SaleEntry, request.args)
+        
+        if party_id_filter:
+            query = query.filter(SaleEntry.party_id == int(party_id_filter))
+        
+        rows, next_after_id = paginate_listing(query, SaleEntry, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid filter: {e}'}), 400
     
-    return jsonify(result)
+    return listing_response([serialize_sale_row(row) for row in rows], next_after_id)
 
-# Helper function to restore tickets back to stock when a sale is deleted
-def restore_to_stock(sale_entry):
+@app.route('/api/sale-entries/batch', methods=['POST'])
+@login_required
+def sale_entries_batch():
     """
-    Restore sold tickets back to stock.
-    Tries to merge with adjacent stock entries if possible, otherwise creates a new entry.
+    Post many sale ranges for one party and date in a single transaction:
+    {"entry_date", "party_id", "ranges": [{"category_id", "ticket_code", "start_number", "end_number",
+    "quantity"?, "rate"?, "notes"?}]}. quantity defaults to tickets x denomination and rate to the
+    category sale rate. Either every range is saved or none is; `results` reports each range.
+    """
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Request must be an object', 'results': []}), 400
+        party_id = parse_party_id(data.get('party_id'))
+        sale_date = datetime.strptime(data.get('entry_date'), '%Y-%m-%d').date()
+        ranges = data.get('ranges') or []
+        if not isinstance(ranges, list):
+            return jsonify({'success': False, 'message': 'ranges must be a list', 'results': []}), 400
+        if not ranges:
+            return jsonify({'success': False, 'message': 'No ranges given', 'results': []}), 400
+        
+        results, ok = post_sale_ranges(ranges, sale_date, party_id, current_user.id)
+        if not ok:
+            db.session.rollback()
+            failed = sum(1 for result in results if not result['success'])
+            return jsonify({
+                'success': False,
+                'message': f'{failed} of {len(ranges)} ranges failed; no sales were saved',
+                'results': results
+            }), 400
+        
+        db.session.commit()
+        return jsonify({'success': True, 'message': f'{len(ranges)} sale entries created', 'results': results})
+    except Exception as e:
+        logger.error(f"[SALE-BATCH POST] Error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# Helper functions to restore tickets back to stock when a sale is deleted or edited
+def restore_to_stock(sale_entry, start_value=None, end_value=None):
+    """
+    Restore sold tickets back to stock: the whole sale, or only start_value..end_value of it.
+    Each allocation goes back into the lot it was taken from (same distributor, rate, purchase date
+    and notes) and is coalesced with that lot's touching rows by two index seeks; the restored
+    part is removed from the sale's allocations. Tickets without an allocation (sales recorded
+    before allocations existed) fall back to restore_unallocated_sale.
+    """
+    start_value = sale_entry.start_value if start_value is None else start_value
+    end_value = sale_entry.end_value if end_value is None else end_value
+    category = reference_row('category', sale_entry.category_id)
+    denomination = int(category.denomination) if category and category.denomination.isdigit() else 1
+    
+    cursor = start_value
+    for allocation in sorted(sale_entry.allocations, key=lambda a: a.start_value):
+        low, high = max(allocation.start_value, start_value), min(allocation.end_value, end_value)
+        if low > high:
+            continue
+        if low > cursor:
+            restore_unallocated_sale(sale_entry, cursor, low - 1)
+        cursor = high + 1
+        
+        whole = low == allocation.start_value and high == allocation.end_value
+        quantity = allocation.quantity if whole else (high - low + 1) * denomination
+        entry = StockEntry(
+            category_id=sale_entry.category_id,
+            distributor_id=allocation.distributor_id,
+            entry_date=allocation.entry_date,
+            ticket_code=sale_entry.ticket_code,
+            start_number=format_ticket_number(low, sale_entry.number_width),
+            end_number=format_ticket_number(high, sale_entry.number_width),
+            quantity=quantity,
+            rate=allocation.rate,
+            amount=(allocation.rate or 0) * quantity,
+            notes=allocation.notes,
+            created_by=sale_entry.created_by,
+            origin_id=allocation.origin_id
+        )
+        db.session.add(entry)
+        coalesce_stock_entry(entry)
+        
+        # Keep allocating the tickets of this lot that stay sold
+        if high < allocation.end_value:
+            sale_entry.allocations.append(SaleAllocation(
+                start_value=high + 1,
+                end_value=allocation.end_value,
+                quantity=(allocation.end_value - high) * denomination,
+                distributor_id=allocation.distributor_id,
+                rate=allocation.rate,
+                entry_date=allocation.entry_date,
+                notes=allocation.notes,
+                origin_id=allocation.origin_id
+            ))
+        if low > allocation.start_value:
+            allocation.end_value = low - 1
+            allocation.quantity = (low - allocation.start_value) * denomination
+        else:
+            sale_entry.allocations.remove(allocation)
+    
+    if cursor <= end_value:
+        restore_unallocated_sale(sale_entry, cursor, end_value)
+
+def restore_unallocated_sale(sale_entry, start_num, end_num):
+    """
+    Restore tickets start_num..end_num of a sale recorded before sale allocations existed,
+    whose source lot is unknown. Extends the adjacent stock entry if there is one (coalescing it with the entry on the other side
+    when they share a lot key), otherwise creates a new entry.
     """
     category_id = sale_entry.category_id
     ticket_code = sale_entry.ticket_code
-    start_num = int(sale_entry.start_number)
-    end_num = int(sale_entry.end_number)
-    num_length = len(sale_entry.start_number)
+    num_length = sale_entry.number_width
     
     # Get category for denomination
-    category = Category.query.get(category_id)
+    category = reference_row('category', category_id)
     denomination = int(category.denomination) if category else 1
     
-    # Find adjacent stock entries to merge with
-    stock_query = StockEntry.query.filter_by(category_id=category_id)
-    if ticket_code:
-        stock_query = stock_query.filter_by(ticket_code=ticket_code)
-    else:
-        stock_query = stock_query.filter(StockEntry.ticket_code.is_(None))
-    
-    stock_entries = stock_query.all()
-    
-    # Look for entries that are immediately adjacent
-    left_entry = None  # Entry that ends just before our start
-    right_entry = None  # Entry that starts just after our end
-    
-    for stock in stock_entries:
-        stock_start = int(stock.start_number)
-        stock_end = int(stock.end_number)
-        
-        if stock_end == start_num - 1:
-            left_entry = stock
-        if stock_start == end_num + 1:
-            right_entry = stock
-    
-    # Merge logic
-    if left_entry and right_entry:
-        # Merge all three: extend left to include right, delete right
-        left_entry.end_number = right_entry.end_number
-        new_start = int(left_entry.start_number)
-        new_end = int(right_entry.end_number)
-        ticket_count = new_end - new_start + 1
-        left_entry.quantity = ticket_count * denomination
-        left_entry.amount = (left_entry.rate or 0) * left_entry.quantity
-        db.session.delete(right_entry)
-    elif left_entry:
-        # Extend left entry to include our range
-        left_entry.end_number = str(end_num).zfill(num_length)
-        new_start = int(left_entry.start_number)
-        ticket_count = end_num - new_start + 1
-        left_entry.quantity = ticket_count * denomination
+    # Find immediately adjacent stock entries to merge with
+    stock_query = stock_range_query(category_id, ticket_code)
+    
+    # Entry that ends just before our start (the nearest entry below us, if it touches)
+    left_entry = stock_query.filter(StockEntry.start_value < start_num).order_by(StockEntry.start_value.desc()).first()
+    if left_entry and left_entry.end_value != start_num - 1:
+        left_entry = None
+    
+    # Entry that starts just after our end
+    right_entry = stock_query.filter(StockEntry.start_value == end_num + 1).first()
+    
+    # The restored tickets join the lot they touch; the right neighbour is merged in as well
+    # when it belongs to the same lot
+    ticket_count = end_num - start_num + 1
+    if left_entry:
+        left_entry.end_number = format_ticket_number(end_num, num_length)
+        left_entry.quantity = (left_entry.quantity or 0) + ticket_count * denomination
         left_entry.amount = (left_entry.rate or 0) * left_entry.quantity
+        if right_entry and stock_lot_key(right_entry) == stock_lot_key(left_entry):
+            _merge_stock_entries(left_entry, right_entry)
     elif right_entry:
-        # Extend right entry to include our range
-        right_entry.start_number = str(start_num).zfill(num_length)
-        new_end = int(right_entry.end_number)
-        ticket_count = new_end - start_num + 1
-        right_entry.quantity = ticket_count * denomination
+        right_entry.start_number = format_ticket_number(start_num, num_length)
+        right_entry.quantity = (right_entry.quantity or 0) + ticket_count * denomination
         right_entry.amount = (right_entry.rate or 0) * right_entry.quantity
     else:
         # Create new stock entry
-        ticket_count = end_num - start_num + 1
         new_entry = StockEntry(
             category_id=category_id,
             distributor_id=None,  # Original distributor info is lost
             entry_date=sale_entry.entry_date,
             ticket_code=ticket_code,
-            start_number=str(start_num).zfill(num_length),
-            end_number=str(end_num).zfill(num_length),
+            start_number=format_ticket_number(start_num, num_length),
+            end_number=format_ticket_number(end_num, num_length),
             quantity=ticket_count * denomination,
             rate=0,  # Rate info from original purchase is lost
             amount=0,
@@ -962,9 +2742,72 @@ def restore_to_stock(sale_entry):
         )
         db.session.add(new_entry)
 
+# Helper function to deduct part of an edited sale from stock
+def deduct_sale_range(sale_entry, start_value, end_value, category):
+    """
+    Deduct tickets start_value..end_value for a sale from the stock lots holding them (purchased on
+    or before the sale date, read with one ordered query) and record one allocation per lot.
+    Raises ValueError when they are not in stock.
+    """
+    lots = stock_lots_query(sale_entry.category_id, sale_entry.ticket_code,
+                            start_value, end_value, sale_entry.entry_date).all()
+    covered = covering_lots(lots, start_value, end_value)
+    if covered is None:
+        width = sale_entry.number_width
+        raise ValueError(f"Tickets {format_ticket_number(start_value, width)}-{format_ticket_number(end_value, width)} "
+                         f"are not available in stock for this date. Stock must be purchased on or before the sale date.")
+    denomination = int(category.denomination) if category.denomination.isdigit() else 1
+    for k in covered:
+        lot = lots[k]
+        low, high = max(lot.start_value, start_value), min(lot.end_value, end_value)
+        sale_entry.allocations.append(new_sale_allocation(lot, low, high, denomination))
+        deduct_from_stock(lot, low, high, category)
+
+def range_difference(start, end, other_start, other_end):
+    """Parts of start..end outside other_start..other_end, as a list of (start, end)"""
+    parts = []
+    if start < other_start:
+        parts.append((start, min(end, other_start - 1)))
+    if end > other_end:
+        parts.append((max(start, other_end + 1), end))
+    return parts
+
+def update_sale_range(sale_entry, category_id, ticket_code, start_number, end_number):
+    """
+    Move a sale to a new category/code/ticket range without committing. Only the symmetric
+    difference between the old and new range touches stock: tickets no longer sold are restored,
+    newly sold ones deducted. A category or code change restores and deducts the whole range.
+    """
+    start_number, end_number = str(start_number).strip(), str(end_number).strip()
+    new_start, new_end = int(start_number), int(end_number)
+    if new_end < new_start:
+        raise ValueError(f'End number {end_number} is before start number {start_number}')
+    category = reference_row('category', category_id)
+    if not category:
+        raise ValueError('Category not found')
+    
+    old_start, old_end = sale_entry.start_value, sale_entry.end_value
+    if category_id != sale_entry.category_id or ticket_code != sale_entry.ticket_code:
+        to_restore, to_deduct = [(old_start, old_end)], [(new_start, new_end)]
+    else:
+        to_restore = range_difference(old_start, old_end, new_start, new_end)
+        to_deduct = range_difference(new_start, new_end, old_start, old_end)
+    
+    for start, end in to_restore:
+        restore_to_stock(sale_entry, start, end)
+    
+    sale_entry.category_id = category_id
+    sale_entry.ticket_code = ticket_code
+    sale_entry.start_number = start_number
+    sale_entry.end_number = end_number
+    
+    for start, end in to_deduct:
+        deduct_sale_range(sale_entry, start, end, category)
+
 @app.route('/api/sale-entries/<int:entry_id>', methods=['PUT', 'DELETE'])
 @login_required
 def manage_sale_entry(entry_id):
+    lock_stock_for_write()
     entry = SaleEntry.query.get(entry_id)
     if not entry:
         return jsonify({'success': False, 'message': 'Entry not found'}), 404
@@ -976,14 +2819,33 @@ def manage_sale_entry(entry_id):
         db.session.commit()
         return jsonify({'success': True, 'message': 'Sale entry deleted and tickets restored to stock'})
     
-    # PUT - Update entry (only allow rate changes, not ticket range changes)
+    # PUT - Update the rate, quantity and notes, and/or move the sale to another category, code or
+    # ticket range in one transaction
     data = request.get_json()
     
     try:
-        # For simplicity, only allow updating rate (not changing ticket range)
-        # Changing ticket range would require complex stock restoration/re-deduction
+        category_id = int(data.get('category_id') or entry.category_id)
+        ticket_code = entry.ticket_code
+        if 'ticket_code' in data:
+            ticket_code = str(data['ticket_code'] or '').strip().upper() or None
+        start_number = data.get('start_number') or entry.start_number
+        end_number = data.get('end_number') or entry.end_number
+        
+        range_changed = (category_id != entry.category_id or ticket_code != entry.ticket_code
+                         or int(start_number) != entry.start_value or int(end_number) != entry.end_value)
+        if range_changed:
+            update_sale_range(entry, category_id, ticket_code, start_number, end_number)
+        
         if 'rate' in data:
             entry.rate = float(data['rate'])
+        if data.get('quantity') not in (None, ''):
+            entry.quantity = int(data['quantity'])
+        elif range_changed:
+            category = reference_row('category', category_id)
+            denomination = int(category.denomination) if category.denomination.isdigit() else 1
+            entry.quantity = (entry.end_value - entry.start_value + 1) * denomination
+        if 'notes' in data:
+            entry.notes = data['notes']
         # Recalculate amount
         entry.amount = (entry.rate or 0) * (entry.quantity or 0)
         
@@ -993,45 +2855,171 @@ def manage_sale_entry(entry_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 400
 
+# CSV export layouts: header plus a row formatter over the listing query tuples
+EXPORT_CHUNK_ROWS = 1000
+
+EXPORT_LAYOUTS = {
+    # Full stock export (the original /api/export-csv format)
+    'stock': (
+        ['Date', 'Category', 'Series', 'Denomination', 'Code', 'Start Number', 'End Number', 'Quantity', 'Rate', 'Amount', 'Notes'],
+        lambda row: [row.entry_date.strftime('%Y-%m-%d'), row.category, row.series, row.denomination,
+                     row.ticket_code or '', row.start_number, row.end_number, row.quantity,
+                     row.rate or 0, row.amount or 0, row.notes or '']
+    ),
+    'purchase': (
+        ['Date', 'Distributor', 'Category', 'Code', 'Start Number', 'End Number', 'Quantity', 'Rate', 'Amount'],
+        lambda row: [row.entry_date.strftime('%Y-%m-%d'), row.distributor or '', row.category,
+                     row.ticket_code or '', row.start_number, row.end_number, row.quantity,
+                     row.rate or 0, row.amount or 0]
+    ),
+    'sale': (
+        ['Date', 'Party', 'Category', 'Code', 'Start Number', 'End Number', 'Quantity', 'Rate', 'Amount'],
+        lambda row: [row.entry_date.strftime('%Y-%m-%d'), row.party or '', row.category,
+                     row.ticket_code or '', row.start_number, row.end_number, row.quantity,
+                     row.rate or 0, row.amount or 0]
+    )
+}
+
+def stream_csv(header, format_row, rows):
+    """Yield CSV text in chunks of EXPORT_CHUNK_ROWS rows so only one chunk is held in memory"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    
+    for count, row in enumerate(rows, 1):
+        writer.writerow(format_row(row))
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
 @app.route('/api/export-csv')
 @login_required
 def export_csv():
-    date_filter = request.args.get('date')
-    
-    query = StockEntry.query
-    if date_filter:
-        query = query.filter_by(entry_date=datetime.strptime(date_filter, '%Y-%m-%d').date())
-    
-    entries = query.all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Date', 'Category', 'Series', 'Denomination', 'Code', 'Start Number', 'End Number', 'Quantity', 'Rate', 'Amount', 'Notes'])
-    
-    for entry in entries:
-        category = Category.query.get(entry.category_id)
-        writer.writerow([
-            entry.entry_date.strftime('%Y-%m-%d'),
-            category.name,
-            category.series,
-            category.denomination,
-            entry.ticket_code or '',
-            entry.start_number,
-            entry.end_number,
-            entry.quantity,
-            entry.rate or 0,
-            entry.amount or 0,
-            entry.notes or ''
-        ])
+    """
+    Stream stock, purchase or sale entries as CSV (`type` = stock, purchase or sale).
+    Accepts the same filters as the listing endpoints, including date ranges.
+    Rows are read from the database in batches and sent as a chunked response.
+    With `check=1` only the filters are validated and {'success': True, 'empty': bool} is returned,
+    so the client can report errors or an empty export before starting the download.
+    """
+    export_type = request.args.get('type', 'stock')
+    if export_type not in EXPORT_LAYOUTS:
+        return jsonify({'success': False, 'message': 'Export type must be stock, purchase or sale'}), 400
     
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.getvalue().encode()),
+    owner = None
+    try:
+        if export_type == 'sale':
+            query = apply_entry_filters(sale_listing_query(), SaleEntry, request.args)
+            owner_id = request.args.get('party_id')
+            if owner_id:
+                query = query.filter(SaleEntry.party_id == int(owner_id))
+                owner = reference_row('party', owner_id)
+        else:
+            query = apply_entry_filters(stock_listing_query(), StockEntry, request.args)
+            owner_id = request.args.get('distributor_id')
+            if owner_id:
+                query = query.filter(StockEntry.distributor_id == int(owner_id))
+                owner = reference_row('distributor', owner_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid filter: {e}'}), 400
+    
+    if request.args.get('check'):
+        return jsonify({'success': True, 'empty': query.first() is None})
+    
+    # File name: lottery_stock_YYYYMMDD.csv for the full export, otherwise type, dates and owner
+    if export_type == 'stock':
+        download_name = f'lottery_stock_{datetime.now().strftime("%Y%m%d")}.csv'
+    else:
+        date_part = request.args.get('date') or '_'.join(
+            request.args.get(arg) for arg in ('date_from', 'date_to') if request.args.get(arg)) or 'all'
+        owner_part = f'_{owner.name}' if owner else ''
+        download_name = f'{export_type}_{date_part}{owner_part}.csv'.replace(' ', '_')
+    
+    header, format_row = EXPORT_LAYOUTS[export_type]
+    rows = query.yield_per(EXPORT_CHUNK_ROWS)
+    return Response(
+        stream_with_context(stream_csv(header, format_row, rows)),
         mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'lottery_stock_{datetime.now().strftime("%Y%m%d")}.csv'
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
     )
 
+# Dashboard summary: aggregates computed in SQL so the response size is independent of table size
+RECENT_ACTIVITY_LIMIT = 10
+
+@app.route('/api/dashboard/summary')
+@login_required
+@conditional_get('stock_entry', 'sale_entry', 'category', vary=lambda: datetime.now().date())
+def dashboard_summary():
+    """
+    Totals, per-category stock, today's purchase/sale figures and recent activity for the dashboard.
+    `date` selects "today" (defaults to the server date).
+    """
+    try:
+        today = parse_date_arg(request.args, 'date') or datetime.now().date()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid date: {e}'}), 400
+    
+    # Current stock comes from the materialized stock_balance table
+    total_entries, total_tickets = db.session.query(
+        db.func.coalesce(db.func.sum(StockBalance.entries), 0),
+        db.func.coalesce(db.func.sum(StockBalance.quantity), 0)
+    ).one()
+    
+    category_stock = db.session.query(
+        Category.id,
+        Category.name,
+        db.func.coalesce(db.func.sum(StockBalance.quantity), 0)
+    ).outerjoin(StockBalance, StockBalance.category_id == Category.id) \
+     .group_by(Category.id) \
+     .order_by(Category.id).all()
+    
+    purchase_qty, purchase_amount = db.session.query(
+        db.func.coalesce(db.func.sum(StockEntry.quantity), 0),
+        db.func.coalesce(db.func.sum(StockEntry.amount), 0)
+    ).filter(StockEntry.entry_date == today).one()
+    
+    sale_qty, sale_amount = db.session.query(
+        db.func.coalesce(db.func.sum(SaleEntry.quantity), 0),
+        db.func.coalesce(db.func.sum(SaleEntry.amount), 0)
+    ).filter(SaleEntry.entry_date == today).one()
+    
+    # Latest purchases and sales by date, merged into one list
+    recent = []
+    for tx_type, query, model in (('Purchase', stock_listing_query(), StockEntry),
+                                  ('Sale', sale_listing_query(), SaleEntry)):
+        rows = query.order_by(None).order_by(model.entry_date.desc(), model.id.desc()) \
+                    .limit(RECENT_ACTIVITY_LIMIT).all()
+        for row in rows:
+            recent.append({
+                'type': tx_type,
+                'date': row.entry_date.strftime('%Y-%m-%d'),
+                'category': row.category or 'Unknown',
+                'ticket_code': row.ticket_code or '',
+                'start_number': row.start_number,
+                'end_number': row.end_number,
+                'quantity': row.quantity,
+                'amount': row.amount or 0
+            })
+    recent.sort(key=lambda tx: tx['date'], reverse=True)
+    
+    return jsonify({
+        'date': today.strftime('%Y-%m-%d'),
+        'total_categories': len(category_stock),
+        'total_entries': total_entries,
+        'total_tickets': total_tickets,
+        'today': {
+            'purchase_quantity': purchase_qty,
+            'purchase_amount': purchase_amount,
+            'sale_quantity': sale_qty,
+            'sale_amount': sale_amount
+        },
+        'category_stock': [{'id': cat_id, 'name': name, 'quantity': qty} for cat_id, name, qty in category_stock],
+        'recent': recent[:RECENT_ACTIVITY_LIMIT]
+    })
+
 @app.route('/api/admin/make-admin', methods=['POST'])
 @login_required
 def make_admin():
@@ -1063,50 +3051,309 @@ def get_users():
         'created_at': u.created_at.strftime('%Y-%m-%d %H:%M:%S')
     } for u in users])
 
-if __name__ == '__main__':
-    with app.app_context():
+@app.route('/api/admin/diagnostics', methods=['GET', 'POST'])
+@login_required
+def admin_diagnostics():
+    """Read or set the app-wide diagnostics toggle (resets to LOT_DIAGNOSTICS on restart)"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        app.config['DIAGNOSTICS'] = bool(data.get('enabled'))
+    
+    return jsonify({'success': True, 'enabled': app.config['DIAGNOSTICS']})
+
+@app.route('/api/admin/metrics')
+@login_required
+def admin_metrics():
+    """Per-route request, latency and SQL metrics in Prometheus text format"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Server-sent change events. Each open window holds one stream; it is idle (apart from a keepalive
+# comment) until a write commits, then receives one compact 'change' event listing the tables,
+# operations and row ids of that commit. A stream occupies a server thread for as long as it is
+# open, so at most SSE_MAX_STREAMS run at once; windows turned away get a 503 and poll instead.
+SSE_KEEPALIVE_SECONDS = 25
+SSE_RETRY_AFTER_SECONDS = 60
+_event_stream_slots = threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS'])
+
+@app.route('/api/events')
+@login_required
+def change_events():
+    """Stream committed changes as server-sent events ('change', or 'resync' when events were missed)"""
+    if not _event_stream_slots.acquire(blocking=False):
+        return jsonify({'success': False, 'message': 'Too many live-update streams; poll for changes'}), 503, \
+            {'Retry-After': str(SSE_RETRY_AFTER_SECONDS)}
+    
+    # Event ids are "<epoch>:<n>"; a Last-Event-ID from this process resumes after n,
+    # any other one (e.g. from before a restart) gets a resync first
+    last_event_id = request.headers.get('Last-Event-ID')
+    epoch, _, last_seen = (last_event_id or '').partition(':')
+    resume = epoch == TABLE_VERSION_EPOCH and last_seen.isdigit() and int(last_seen) <= change_feed.last_id
+    
+    def stream(after_id):
+        yield 'retry: 2000\n\n'
+        if last_event_id and not resume:
+            yield f'id: {TABLE_VERSION_EPOCH}:{after_id}\nevent: resync\ndata: {{}}\n\n'
+        while True:
+            events = change_feed.wait(after_id, SSE_KEEPALIVE_SECONDS)
+            if events is None:
+                after_id = change_feed.last_id
+                yield f'id: {TABLE_VERSION_EPOCH}:{after_id}\nevent: resync\ndata: {{}}\n\n'
+            elif not events:
+                yield ': keepalive\n\n'
+            else:
+                for event_id, data in events:
+                    yield f'id: {TABLE_VERSION_EPOCH}:{event_id}\nevent: change\ndata: {data}\n\n'
+                after_id = events[-1][0]
+    
+    response = Response(stream(int(last_seen) if resume else change_feed.last_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The server closes the response when the client disconnects (or the stream never starts)
+    response.call_on_close(_event_stream_slots.release)
+    return response
+
+# Schema migrations. PRAGMA user_version records the last applied version; upgrade_database()
+# runs the pending ones in order, each in its own transaction, from both app.py and run_app.py.
+def migrate_legacy_schema():
+    """Bring a database created before versioned migrations up to the version 1 schema"""
+    from sqlalchemy import inspect, text
+    had_stock_balance = inspect(db.engine).has_table('stock_balance')
+    
+    db.create_all()
+    
+    # Add rate and amount columns if they don't exist
+    inspector = inspect(db.engine)
+    
+    # Migrate stock_entry table
+    stock_columns = [col['name'] for col in inspector.get_columns('stock_entry')]
+    
+    if 'rate' not in stock_columns:
+        db.session.execute(text('ALTER TABLE stock_entry ADD COLUMN rate FLOAT DEFAULT 0'))
+        logger.info("Added 'rate' column to stock_entry table")
+    
+    if 'amount' not in stock_columns:
+        db.session.execute(text('ALTER TABLE stock_entry ADD COLUMN amount FLOAT DEFAULT 0'))
+        logger.info("Added 'amount' column to stock_entry table")
+    
+    if 'ticket_code' not in stock_columns:
+        db.session.execute(text('ALTER TABLE stock_entry ADD COLUMN ticket_code VARCHAR(10)'))
+        logger.info("Added 'ticket_code' column to stock_entry table")
+    
+    # Migrate category table for purchase_rate and sale_rate
+    category_columns = [col['name'] for col in inspector.get_columns('category')]
+    
+    if 'purchase_rate' not in category_columns:
+        db.session.execute(text('ALTER TABLE category ADD COLUMN purchase_rate FLOAT DEFAULT 0'))
+        logger.info("Added 'purchase_rate' column to category table")
+    
+    if 'sale_rate' not in category_columns:
+        db.session.execute(text('ALTER TABLE category ADD COLUMN sale_rate FLOAT DEFAULT 0'))
+        logger.info("Added 'sale_rate' column to category table")
+    
+    # Migrate sale_entry table
+    sale_columns = [col['name'] for col in inspector.get_columns('sale_entry')]
+    
+    if 'party_id' not in sale_columns:
+        db.session.execute(text('ALTER TABLE sale_entry ADD COLUMN party_id INTEGER REFERENCES party(id)'))
+        logger.info("Added 'party_id' column to sale_entry table")
+    
+    # Integer ticket range storage: add the columns, then backfill them in place from the
+    # underscore-prefixed text (rows written before TextString may lack the prefix)
+    for table, columns in (('stock_entry', stock_columns), ('sale_entry', sale_columns)):
+        for column in ('start_value', 'end_value', 'number_width'):
+            if column not in columns:
+                db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} INTEGER'))
+                logger.info(f"Added '{column}' column to {table} table")
+        
+        backfilled = db.session.execute(text(f"""
+            UPDATE {table} SET
+                start_value = CAST(ltrim(start_number, '_') AS INTEGER),
+                end_value = CAST(ltrim(end_number, '_') AS INTEGER),
+                number_width = length(ltrim(start_number, '_'))
+            WHERE start_value IS NULL OR end_value IS NULL OR number_width IS NULL
+        """)).rowcount
+        if backfilled:
+            logger.info(f"Backfilled integer ticket numbers for {backfilled} {table} rows")
+    
+    # Range index for overlap/containment lookups (create_all only adds it to new tables)
+    stock_indexes = [idx['name'] for idx in inspector.get_indexes('stock_entry')]
+    if 'ix_stock_entry_code_start' not in stock_indexes:
+        db.session.execute(text('CREATE INDEX ix_stock_entry_code_start ON stock_entry (category_id, ticket_code, start_value)'))
+        logger.info("Added 'ix_stock_entry_code_start' index to stock_entry table")
+    
+    # Populate the stock_balance summary table the first time it is created
+    if not had_stock_balance:
+        rebuild_stock_balance()
+        logger.info("Built stock_balance table from existing stock entries")
+
+def add_hot_path_indexes():
+    """Composite indexes for the category/code, date, distributor and party filters"""
+    from sqlalchemy import text
+    for index in (
+        'CREATE INDEX IF NOT EXISTS ix_stock_entry_date ON stock_entry (entry_date)',
+        'CREATE INDEX IF NOT EXISTS ix_stock_entry_distributor_date ON stock_entry (distributor_id, entry_date)',
+        'CREATE INDEX IF NOT EXISTS ix_sale_entry_code_start ON sale_entry (category_id, ticket_code, start_value)',
+        'CREATE INDEX IF NOT EXISTS ix_sale_entry_date ON sale_entry (entry_date)',
+        'CREATE INDEX IF NOT EXISTS ix_sale_entry_party_date ON sale_entry (party_id, entry_date)',
+    ):
+        db.session.execute(text(index))
+    # Refresh planner statistics so the new indexes are weighed correctly
+    db.session.execute(text('ANALYZE'))
+
+def add_sale_allocations():
+    """Table recording the stock lot each sale was deducted from"""
+    SaleAllocation.__table__.create(bind=db.session.connection(), checkfirst=True)
+
+def add_write_counter():
+    """Counter of committed write transactions, so the app notices other processes' writes"""
+    WriteCounter.__table__.create(bind=db.session.connection(), checkfirst=True)
+
+def add_stock_lot_origin():
+    """
+    origin_id columns tying stock fragments and sale allocations to their purchase. Existing rows
+    keep NULL, so each existing stock row counts as its own purchase from now on.
+    """
+    from sqlalchemy import inspect, text
+    inspector = inspect(db.session.connection())
+    for table in ('stock_entry', 'sale_allocation'):
+        if 'origin_id' not in [col['name'] for col in inspector.get_columns(table)]:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN origin_id INTEGER'))
+            logger.info(f"Added 'origin_id' column to {table} table")
+
+MIGRATIONS = [
+    (1, 'legacy columns, integer ticket numbers and stock_balance', migrate_legacy_schema),
+    (2, 'composite indexes for hot query paths', add_hot_path_indexes),
+    (3, 'sale allocations', add_sale_allocations),
+    (4, 'write counter', add_write_counter),
+    (5, 'stock lot origin', add_stock_lot_origin),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version():
+    from sqlalchemy import text
+    return db.session.execute(text('PRAGMA user_version')).scalar()
+
+def set_schema_version(version):
+    from sqlalchemy import text
+    db.session.execute(text(f'PRAGMA user_version = {int(version)}'))
+
+def upgrade_database():
+    """
+    Create a fresh database or apply pending MIGRATIONS to an existing lottery.db.
+    Returns the schema version. Does nothing when the stored version is current.
+    """
+    from sqlalchemy import inspect
+    version = get_schema_version()
+    if version >= SCHEMA_VERSION:
+        return version
+    
+    # Fresh database: create_all builds the current schema, indexes included
+    if version == 0 and not inspect(db.engine).get_table_names():
         db.create_all()
-        
-        # Add rate and amount columns if they don't exist (migration for existing databases)
-        from sqlalchemy import inspect, text
-        inspector = inspect(db.engine)
-        
-        # Migrate stock_entry table
-        stock_columns = [col['name'] for col in inspector.get_columns('stock_entry')]
-        
-        if 'rate' not in stock_columns:
-            db.session.execute(text('ALTER TABLE stock_entry ADD COLUMN rate FLOAT DEFAULT 0'))
-            logger.info("Added 'rate' column to stock_entry table")
-        
-        if 'amount' not in stock_columns:
-            db.session.execute(text('ALTER TABLE stock_entry ADD COLUMN amount FLOAT DEFAULT 0'))
-            logger.info("Added 'amount' column to stock_entry table")
-        
-        if 'ticket_code' not in stock_columns:
-            db.session.execute(text('ALTER TABLE stock_entry ADD COLUMN ticket_code VARCHAR(10)'))
-            logger.info("Added 'ticket_code' column to stock_entry table")
-        
-        # Migrate category table for purchase_rate and sale_rate
-        category_columns = [col['name'] for col in inspector.get_columns('category')]
-        
-        if 'purchase_rate' not in category_columns:
-            db.session.execute(text('ALTER TABLE category ADD COLUMN purchase_rate FLOAT DEFAULT 0'))
-            logger.info("Added 'purchase_rate' column to category table")
-        
-        if 'sale_rate' not in category_columns:
-            db.session.execute(text('ALTER TABLE category ADD COLUMN sale_rate FLOAT DEFAULT 0'))
-            logger.info("Added 'sale_rate' column to category table")
-        
-        # Migrate sale_entry table if it exists
-        table_names = inspector.get_table_names()
-        if 'sale_entry' in table_names:
-            sale_columns = [col['name'] for col in inspector.get_columns('sale_entry')]
-            
-            if 'party_id' not in sale_columns:
-                db.session.execute(text('ALTER TABLE sale_entry ADD COLUMN party_id INTEGER REFERENCES party(id)'))
-                logger.info("Added 'party_id' column to sale_entry table")
-        
+        set_schema_version(SCHEMA_VERSION)
         db.session.commit()
+        logger.info(f"Created database schema version {SCHEMA_VERSION}")
+        return SCHEMA_VERSION
+    
+    for migration_version, description, migrate in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        try:
+            migrate()
+            set_schema_version(migration_version)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.error(f"Schema migration {migration_version} ({description}) failed")
+            raise
+        logger.info(f"Applied schema migration {migration_version}: {description}")
+    return SCHEMA_VERSION
+
+# Serving. run_app.py serves through a production WSGI server when one is installed: waitress
+# (also on Windows) or gunicorn with one gthread worker, else Werkzeug's threaded dev server.
+# The app keeps per-process state (table versions behind the ETags, the change feed, the
+# reference cache), so there is always exactly one serving process; LOT_SERVER_THREADS sets
+# how many requests it handles at once. Each open window's /api/events stream holds one of
+# those threads for as long as it is open, up to SSE_MAX_STREAMS streams.
+SERVERS = ('waitress', 'gunicorn', 'werkzeug')
+
+def _server_available(name):
+    if name == 'werkzeug':
+        return True
+    if name == 'gunicorn' and sys.platform == 'win32':
+        return False
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+def resolve_server(name=None):
+    """The server to use for SERVER ('auto' picks the first available one of SERVERS)"""
+    name = (name or app.config['SERVER']).lower()
+    if name == 'auto':
+        return next(server for server in SERVERS if _server_available(server))
+    if name not in SERVERS:
+        logger.warning(f"Unknown LOT_SERVER '{name}', using the Werkzeug dev server")
+        return 'werkzeug'
+    if not _server_available(name):
+        logger.warning(f"LOT_SERVER={name} is not installed, using the Werkzeug dev server")
+        return 'werkzeug'
+    return name
+
+def serve(host, port):
+    """
+    Serve the app on host:port with the configured server until interrupted, and run the stock
+    compactor in the serving process. Call from the main thread (gunicorn handles signals there).
+    """
+    server = resolve_server()
+    threads = max(1, app.config['SERVER_THREADS'])
+    compact_interval = app.config['STOCK_COMPACT_INTERVAL']
+    logger.info(f"Serving on http://{host}:{port} with {server}"
+                + ('' if server == 'werkzeug' else f" ({threads} threads)"))
+    
+    if server == 'waitress':
+        from waitress import serve as waitress_serve
+        start_stock_compactor(compact_interval)
+        # Event streams send a keepalive every SSE_KEEPALIVE_SECONDS, well inside channel_timeout
+        waitress_serve(app, host=host, port=port, threads=threads, channel_timeout=120, ident='LOT')
+    elif server == 'gunicorn':
+        from gunicorn.app.base import BaseApplication
+        
+        class GunicornServer(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', f'{host}:{port}')
+                self.cfg.set('workers', 1)
+                self.cfg.set('worker_class', 'gthread')
+                self.cfg.set('threads', threads)
+                # Threads are only started in the forked worker, not in the arbiter
+                self.cfg.set('post_worker_init', lambda worker: start_stock_compactor(compact_interval))
+            
+            def load(self):
+                return app
+        
+        # The startup checks ran in this process; close their pooled SQLite connections so the
+        # forked worker opens its own instead of sharing file handles across fork()
+        with app.app_context():
+            db.engine.dispose()
+        GunicornServer().run()
+    else:
+        start_stock_compactor(compact_interval)
+        app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
+
+if __name__ == '__main__':
+    # Under the debug reloader only the serving child process runs the compactor
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_stock_compactor(app.config['STOCK_COMPACT_INTERVAL'])
+    
+    with app.app_context():
+        upgrade_database()
+        check_sqlite_pragmas()
         
         # Create default admin user if doesn't exist
         admin_user = User.query.filter_by(username='admin').first()
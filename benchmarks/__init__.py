@@ -0,0 +1 @@
+"""Standalone benchmarks for the LOT app. Run modules with ``python -m benchmarks.<name>``."""
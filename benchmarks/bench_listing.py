@@ -0,0 +1,117 @@
+"""
+Benchmark and query-count guard for the entry listing endpoints.
+
+Seeds a scratch database with stock and sale entries spread over many categories,
+distributors and parties, then requests /api/stock-entries, /api/sale-entries and
+/api/export-csv. Each request must issue the same small number of SQL statements no
+matter how many rows it returns; the script exits non-zero if that regresses to N+1.
+tests/test_listing.py asserts the same limit under pytest.
+
+Usage:
+    python -m benchmarks.bench_listing [--sizes 100,2000,20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+# Point the app at a scratch database before it is imported
+_tmp_dir = tempfile.mkdtemp(prefix='lot-bench-')
+os.environ['LOT_DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp_dir, 'bench.db')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import app, db, User, Category, Distributor, Party, StockEntry, SaleEntry
+
+ENDPOINTS = ('/api/stock-entries', '/api/sale-entries', '/api/export-csv')
+MAX_STATEMENTS = 4  # Session user load, write counter check (at most once a second) and listing query, with one spare
+USERNAME = PASSWORD = 'bench'
+
+
+def seed_reference_data():
+    """Add the bench user, 20 categories, 50 distributors and 50 parties; returns the user id."""
+    user = User(username=USERNAME, password=generate_password_hash(PASSWORD), is_admin=True)
+    db.session.add(user)
+    db.session.add_all(Category(name=f'M{i}', series='M', denomination=str(i)) for i in range(1, 21))
+    db.session.add_all(Distributor(name=f'Distributor {i}') for i in range(50))
+    db.session.add_all(Party(name=f'Party {i}') for i in range(50))
+    db.session.commit()
+    return user.id
+
+
+def seed(rows, user_id):
+    """Replace all entries with `rows` stock and `rows` sale entries."""
+    db.session.execute(StockEntry.__table__.delete())
+    db.session.execute(SaleEntry.__table__.delete())
+    category_ids = [c.id for c in Category.query.all()]
+    distributor_ids = [d.id for d in Distributor.query.all()]
+    party_ids = [p.id for p in Party.query.all()]
+    
+    stock, sales = [], []
+    for i in range(rows):
+        start = 10000 + i * 100
+        common = {
+            'category_id': category_ids[i % len(category_ids)],
+            'entry_date': date(2026, 1, 1 + i % 28),
+            'ticket_code': '61A',
+            'start_number': str(start),
+            'end_number': str(start + 49),
+            'start_value': start,
+            'end_value': start + 49,
+            'number_width': 5,
+            'quantity': 50,
+            'rate': 6.44,
+            'amount': 322.0,
+            'created_by': user_id
+        }
+        stock.append(dict(common, distributor_id=distributor_ids[i % len(distributor_ids)]))
+        sales.append(dict(common, party_id=party_ids[i % len(party_ids)]))
+    db.session.execute(StockEntry.__table__.insert(), stock)
+    db.session.execute(SaleEntry.__table__.insert(), sales)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,2000,20000', help='Comma separated row counts per table')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        db.create_all()
+        user_id = seed_reference_data()
+    
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(1))
+    
+    client = app.test_client()
+    client.post('/login', json={'username': USERNAME, 'password': PASSWORD})
+    
+    failures = []
+    print(f"{'rows':>8}  {'endpoint':<22}  {'ms':>9}  {'statements':>10}")
+    for rows in [int(size) for size in args.sizes.split(',')]:
+        with app.app_context():
+            seed(rows, user_id)
+        for endpoint in ENDPOINTS:
+            statements.clear()
+            began = time.perf_counter()
+            response = client.get(endpoint)
+            response.get_data()
+            elapsed = (time.perf_counter() - began) * 1000
+            print(f"{rows:>8}  {endpoint:<22}  {elapsed:>9.1f}  {len(statements):>10}")
+            if response.status_code != 200 or len(statements) > MAX_STATEMENTS:
+                failures.append((rows, endpoint, response.status_code, len(statements)))
+    
+    if failures:
+        for rows, endpoint, status, count in failures:
+            print(f"FAIL {endpoint} with {rows} rows: status {status}, {count} statements (max {MAX_STATEMENTS})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
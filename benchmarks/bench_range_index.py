@@ -0,0 +1,104 @@
+"""
+Benchmark for ticket range overlap/containment lookups.
+
+Fills a scratch database with N stock fragments for a single category/code and times
+check_overlapping_range and the sale path's lookup of the lots covering a range
+(stock_lots_query + covering_lots). With ix_stock_entry_code_start the per-lookup latency
+should stay flat as N grows.
+
+Usage:
+    python -m benchmarks.bench_range_index [--sizes 1000,10000,50000] [--lookups 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+# Point the app at a scratch database before it is imported
+_tmp_dir = tempfile.mkdtemp(prefix='lot-bench-')
+os.environ['LOT_DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp_dir, 'bench.db')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, User, Category, StockEntry, check_overlapping_range, stock_lots_query, covering_lots
+
+FRAGMENT_SIZE = 50  # Tickets per stock fragment
+GAP = 10  # Sold tickets between fragments
+
+
+def seed(rows, user_id, category_id):
+    """Replace all stock with `rows` fragments for one category/code."""
+    db.session.execute(StockEntry.__table__.delete())
+    batch = []
+    for i in range(rows):
+        start = 100000 + i * (FRAGMENT_SIZE + GAP)
+        batch.append({
+            'category_id': category_id,
+            'distributor_id': None,
+            'entry_date': date(2026, 1, 1),
+            'ticket_code': '61A',
+            'start_number': str(start),
+            'end_number': str(start + FRAGMENT_SIZE - 1),
+            'start_value': start,
+            'end_value': start + FRAGMENT_SIZE - 1,
+            'number_width': 6,
+            'quantity': FRAGMENT_SIZE,
+            'rate': 6.44,
+            'amount': 6.44 * FRAGMENT_SIZE,
+            'created_by': user_id
+        })
+    db.session.execute(StockEntry.__table__.insert(), batch)
+    db.session.commit()
+
+
+def find_covering_lots(category_id, ticket_code, start, end):
+    """The lots holding start..end, looked up as post_sale_ranges does; None when not in stock."""
+    lots = stock_lots_query(category_id, ticket_code, start, end).all()
+    covered = covering_lots(lots, start, end)
+    return None if covered is None else [lots[i] for i in covered]
+
+
+def time_lookups(rows, lookups, category_id):
+    """Return mean microseconds per call for each lookup helper."""
+    rng = random.Random(rows)
+    probes = []
+    for _ in range(lookups):
+        start = 100000 + rng.randrange(rows) * (FRAGMENT_SIZE + GAP) + rng.randrange(FRAGMENT_SIZE // 2)
+        probes.append((start, start + rng.randrange(FRAGMENT_SIZE // 2)))
+    
+    results = {}
+    for name, func in (('check_overlapping_range', check_overlapping_range),
+                       ('find_covering_lots', find_covering_lots)):
+        began = time.perf_counter()
+        for start, end in probes:
+            func(category_id, '61A', start, end)
+        results[name] = (time.perf_counter() - began) / lookups * 1e6
+        db.session.expire_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000', help='Comma separated stock row counts')
+    parser.add_argument('--lookups', type=int, default=500, help='Lookups timed per size')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', password='x', is_admin=True)
+        category = Category(name='M5', series='M', denomination='1')
+        db.session.add_all([user, category])
+        db.session.commit()
+        
+        print(f"{'rows':>10}  {'overlap (us)':>14}  {'covering lots (us)':>17}")
+        for rows in [int(size) for size in args.sizes.split(',')]:
+            seed(rows, user.id, category.id)
+            result = time_lookups(rows, args.lookups, category.id)
+            print(f"{rows:>10}  {result['check_overlapping_range']:>14.1f}  {result['find_covering_lots']:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
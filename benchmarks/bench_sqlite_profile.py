@@ -0,0 +1,109 @@
+"""
+Commit throughput benchmark for the SQLite connection profiles (SQLITE_PROFILES in app.py).
+
+For each profile a fresh scratch database is created and purchase entries are committed
+one per transaction, first from a single writer and then from several concurrent writer
+threads (as with threaded Flask). Reports commits per second and "database is locked" errors.
+
+Usage:
+    python -m benchmarks.bench_sqlite_profile [--commits 500] [--threads 4]
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+# Point the app at a scratch database before it is imported
+_tmp_dir = tempfile.mkdtemp(prefix='lot-bench-')
+_db_path = os.path.join(_tmp_dir, 'bench.db')
+os.environ['LOT_DATABASE_URI'] = 'sqlite:///' + _db_path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+
+from app import app, db, User, Category, StockEntry, SQLITE_PROFILES, check_sqlite_pragmas
+
+
+def reset_database(profile):
+    """Recreate the scratch database with `profile` applied to new connections."""
+    app.config['SQLITE_PROFILE'] = profile
+    with app.app_context():
+        db.engine.dispose()
+        for path in glob.glob(_db_path + '*'):
+            os.remove(path)
+        db.create_all()
+        check_sqlite_pragmas()
+        user = User(username='bench', password='x', is_admin=True)
+        category = Category(name='M5', series='M', denomination='1')
+        db.session.add_all([user, category])
+        db.session.commit()
+        return user.id, category.id
+
+
+def write_entries(user_id, category_id, first, count, errors):
+    """Commit `count` single-entry transactions, collecting lock errors."""
+    with app.app_context():
+        for i in range(first, first + count):
+            start = 100000 + i * 10
+            db.session.add(StockEntry(
+                category_id=category_id,
+                entry_date=date(2026, 1, 1),
+                ticket_code='61A',
+                start_number=str(start),
+                end_number=str(start + 9),
+                quantity=10,
+                rate=6.44,
+                amount=64.4,
+                created_by=user_id
+            ))
+            try:
+                db.session.commit()
+            except OperationalError as e:
+                db.session.rollback()
+                errors.append(str(e.orig))
+
+
+def run(profile, commits, threads):
+    user_id, category_id = reset_database(profile)
+    results = {}
+    
+    errors = []
+    began = time.perf_counter()
+    write_entries(user_id, category_id, 0, commits, errors)
+    results['single'] = (commits / (time.perf_counter() - began), len(errors))
+    
+    errors = []
+    per_thread = commits // threads
+    workers = [threading.Thread(target=write_entries, args=(user_id, category_id, commits + t * per_thread, per_thread, errors))
+               for t in range(threads)]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results['concurrent'] = (per_thread * threads / (time.perf_counter() - began), len(errors))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commits', type=int, default=500, help='Commits per phase')
+    parser.add_argument('--threads', type=int, default=4, help='Concurrent writer threads')
+    args = parser.parse_args()
+    
+    rows = [(profile, run(profile, args.commits, args.threads)) for profile in SQLITE_PROFILES]
+    
+    print(f"{'profile':<12}  {'single commits/s':>16}  {f'{args.threads} threads commits/s':>20}  {'lock errors':>11}")
+    for profile, results in rows:
+        single, single_errors = results['single']
+        concurrent, concurrent_errors = results['concurrent']
+        print(f"{profile:<12}  {single:>16.0f}  {concurrent:>20.0f}  {single_errors + concurrent_errors:>11}")
+
+
+if __name__ == '__main__':
+    main()
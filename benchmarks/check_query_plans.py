@@ -0,0 +1,91 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot query paths.
+
+Builds a scratch database through upgrade_database(), compiles the queries the app
+actually issues (range seeks, listing filters, dashboard aggregates) and asserts that
+SQLite plans each of them with the expected index. Exits non-zero on any miss.
+tests/test_query_plans.py runs the same cases under pytest.
+
+Usage:
+    python -m benchmarks.check_query_plans
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+# Point the app at a scratch database before it is imported
+_tmp_dir = tempfile.mkdtemp(prefix='lot-plans-')
+os.environ['LOT_DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp_dir, 'plans.db')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, StockEntry, SaleEntry, upgrade_database, stock_range_query, stock_lots_query,
+                 stock_listing_query, sale_listing_query)
+
+DAY = date(2026, 1, 15)
+
+
+def plan_for(query):
+    """EXPLAIN QUERY PLAN detail lines for an ORM query, using its real bound parameters."""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+    return [row[3] for row in rows]
+
+
+def cases():
+    """(description, query, index expected in the plan)"""
+    return [
+        ('overlap/containment seek', stock_range_query(1, '61A')
+            .filter(StockEntry.start_value <= 5000).order_by(StockEntry.start_value.desc()).limit(1),
+         'ix_stock_entry_code_start'),
+        ('stock seek without code', stock_range_query(1, None)
+            .filter(StockEntry.start_value <= 5000, StockEntry.entry_date <= DAY)
+            .order_by(StockEntry.start_value.desc()).limit(1),
+         'ix_stock_entry_code_start'),
+        ('lots covering a sale range', stock_lots_query(1, '61A', 5000, 5200, DAY),
+         'ix_stock_entry_code_start'),
+        ('sale lookup by category/code', SaleEntry.query
+            .filter_by(category_id=1, ticket_code='61A').filter(SaleEntry.start_value <= 5000),
+         'ix_sale_entry_code_start'),
+        ('stock listing by date', stock_listing_query().filter(StockEntry.entry_date == DAY),
+         'ix_stock_entry_date'),
+        ('stock listing by date range', stock_listing_query()
+            .filter(StockEntry.entry_date >= DAY, StockEntry.entry_date <= DAY),
+         'ix_stock_entry_date'),
+        ('stock listing by distributor and date', stock_listing_query()
+            .filter(StockEntry.distributor_id == 1, StockEntry.entry_date == DAY),
+         'ix_stock_entry_distributor_date'),
+        ('sale listing by date', sale_listing_query().filter(SaleEntry.entry_date == DAY),
+         'ix_sale_entry_date'),
+        ('sale listing by party and date', sale_listing_query()
+            .filter(SaleEntry.party_id == 1, SaleEntry.entry_date == DAY),
+         'ix_sale_entry_party_date'),
+        ('dashboard purchases today', db.session.query(db.func.sum(StockEntry.quantity))
+            .filter(StockEntry.entry_date == DAY),
+         'ix_stock_entry_date'),
+        ('dashboard sales today', db.session.query(db.func.sum(SaleEntry.quantity))
+            .filter(SaleEntry.entry_date == DAY),
+         'ix_sale_entry_date'),
+    ]
+
+
+def main():
+    failures = 0
+    with app.app_context():
+        upgrade_database()
+        for description, query, index in cases():
+            plan = plan_for(query)
+            used = any(index in line for line in plan)
+            print(f"{'ok  ' if used else 'FAIL'} {description}: {' | '.join(plan)}")
+            if not used:
+                failures += 1
+
+    if failures:
+        print(f'{failures} queries did not use their index')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Startup-time budget check for the desktop launcher.
+
+Launches `run_app.py --no-window` against a scratch database, waits for its startup log line
+(import, database open, schema check and first response phases) and stops it again. The first
+launch creates the schema; the following ones start on the existing database, as every launch
+after installation does. Exits with status 1 when the median launch, measured from process start
+until `/` answers, is over the budget.
+
+The budget is the startup target, a cold start under 1 s (--budget). To catch regressions on a
+given machine instead, record a baseline there with --output and check later commits with
+--baseline, which allows the baseline median plus --margin (25% by default). tests/test_startup.py
+runs the same check against the 1 s target under pytest.
+
+Usage:
+    python -m benchmarks.check_startup [--budget 1.0] [--runs 3] [--database copy-of-lottery.db]
+                                       [--output startup.json] [--baseline startup.json] [--margin 0.25]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_BUDGET = 1.0  # Seconds from process start until / answers
+STARTUP_LINE = re.compile(r'Startup: (.*), total (\d+) ms')
+PHASE = re.compile(r'([a-z ]+) (\d+) ms')
+
+
+def launch(database_path, timeout=60):
+    """Start run_app.py once; returns (wall seconds until ready, {phase: ms})."""
+    env = dict(os.environ, LOT_DATABASE_URI='sqlite:///' + database_path, LOT_STOCK_COMPACT_INTERVAL='0')
+    # Let the interpreter cache bytecode, as the packaged app ships it precompiled
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    began = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'run_app.py', '--no-window'], cwd=REPO_DIR, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        deadline = time.time() + timeout
+        for line in process.stdout:
+            match = STARTUP_LINE.search(line)
+            if match:
+                wall = time.perf_counter() - began
+                phases = {name.strip(): int(ms) for name, ms in PHASE.findall(match.group(1))}
+                return wall, dict(phases, **{'in process': int(match.group(2))})
+            if time.time() > deadline:
+                break
+        raise RuntimeError('run_app.py did not report its startup time')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET, help='Seconds allowed from process start to first response')
+    parser.add_argument('--runs', type=int, default=3, help='Launches on the existing database')
+    parser.add_argument('--output', help='Write the median startup as JSON to this file (a baseline for later runs)')
+    parser.add_argument('--baseline', help='JSON from an earlier --output; the budget becomes its median plus --margin')
+    parser.add_argument('--margin', type=float, default=0.25, help='Allowed slowdown over the baseline (0.25 = 25%%)')
+    parser.add_argument('--database', help='Start from a copy of this database (the file itself is not touched)')
+    args = parser.parse_args()
+
+    database_path = os.path.join(tempfile.mkdtemp(prefix='lot-startup-'), 'startup.db')
+    if args.database:
+        shutil.copyfile(args.database, database_path)
+
+    results = []
+    for run in range(args.runs + 1):
+        label = 'first launch' if run == 0 else f'launch {run}'
+        wall, phases = launch(database_path)
+        print(f"{label:<13} {wall * 1000:6.0f} ms  " + ', '.join(f'{name} {ms} ms' for name, ms in phases.items()))
+        if run:
+            results.append(wall)
+
+    median = statistics.median(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'median_ms': round(median * 1000), 'runs': [round(wall * 1000) for wall in results]}, f, indent=2)
+
+    budget, source = args.budget, 'fixed'
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_ms = json.load(f)['median_ms']
+        budget, source = baseline_ms * (1 + args.margin) / 1000, f'baseline {baseline_ms} ms + {args.margin:.0%}'
+    print(f"\nMedian startup {median * 1000:.0f} ms (budget {budget * 1000:.0f} ms, {source})")
+    if median > budget:
+        print('Startup is over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Seeded synthetic data for the benchmarks.
+
+Builds a realistic multi-year history: M/D/E categories in several denominations, ticket
+codes per category, distributors delivering consecutive ticket blocks most days, and sales
+that carve pieces out of those blocks, leaving the fragmented stock the app sees in
+practice. Every sale gets the SaleAllocation row the app would have recorded.
+
+Rows are written with Core executemany in batches, so a million stock rows take about a
+minute. The same seed and size always produce the same database.
+
+Usage (from a script that has already pointed LOT_DATABASE_URI at a scratch database):
+    from benchmarks.datagen import generate
+    with app.app_context():
+        summary = generate(100000, seed=2026)
+"""
+import random
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from app import (db, User, Category, Distributor, Party, StockEntry, SaleEntry, SaleAllocation,
+                 StockBalance, rebuild_stock_balance)
+
+SERIES = ('M', 'D', 'E')
+DENOMINATIONS = (5, 10, 25, 50)
+CODES_PER_CATEGORY = 20
+DISTRIBUTORS = 8
+PARTIES = 40
+HISTORY_START = date(2023, 1, 1)
+HISTORY_DAYS = 3 * 365
+FIRST_TICKET = 1000000  # 7-digit ticket numbers
+BATCH_ROWS = 10000
+
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench'
+
+
+def clear():
+    """Delete all entries and reference data (keeps the schema)."""
+    for model in (SaleAllocation, SaleEntry, StockEntry, StockBalance, Party, Distributor, Category, User):
+        db.session.execute(model.__table__.delete())
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def _insert(model, rows):
+    if rows:
+        db.session.execute(model.__table__.insert(), rows)
+        rows.clear()
+
+
+def _ticket_fields(start, end):
+    width = len(str(FIRST_TICKET))
+    return {
+        'start_number': str(start).zfill(width),
+        'end_number': str(end).zfill(width),
+        'start_value': start,
+        'end_value': end,
+        'number_width': width
+    }
+
+
+def generate(stock_rows, seed=2026):
+    """
+    Replace the database contents with about `stock_rows` stock fragments (and roughly as many
+    sales) spread over three years. Returns a summary dict with the counts and the ids the
+    benchmarks need (user, categories, codes, history dates).
+    """
+    rng = random.Random(f'{seed}:{stock_rows}')
+    clear()
+
+    user = User(username=BENCH_USERNAME, password=generate_password_hash(BENCH_PASSWORD), is_admin=True)
+    categories = [Category(name=f'{series}{denomination}', series=series, denomination=str(denomination),
+                           purchase_rate=round(denomination * 0.92, 2), sale_rate=round(denomination * 0.96, 2))
+                  for series in SERIES for denomination in DENOMINATIONS]
+    distributors = [Distributor(name=f'Distributor {i + 1}') for i in range(DISTRIBUTORS)]
+    parties = [Party(name=f'Party {i + 1}') for i in range(PARTIES)]
+    db.session.add_all([user, *categories, *distributors, *parties])
+    db.session.commit()
+
+    codes = {c.id: sorted({f'{rng.randint(10, 99)}{chr(65 + rng.randrange(26))}' for _ in range(CODES_PER_CATEGORY * 2)})
+             [:CODES_PER_CATEGORY] for c in categories}
+    next_ticket = {}
+
+    # Deliveries are spread evenly over the history; each leaves about three stock fragments
+    deliveries = max(1, stock_rows // 3)
+    stock, sales, allocations = [], [], []
+    stock_count = sale_count = 0
+    delivery = 0
+    while stock_count < stock_rows:
+        day = HISTORY_START + timedelta(days=min(HISTORY_DAYS - 1, delivery * HISTORY_DAYS // deliveries))
+        delivery += 1
+        category = rng.choice(categories)
+        denomination = int(category.denomination)
+        code = rng.choice(codes[category.id])
+        distributor_id = rng.choice(distributors).id
+        rate = category.purchase_rate
+
+        # A consecutive block of tickets, occasionally leaving a gap before the next delivery
+        size = rng.randint(100, 1000)
+        start = next_ticket.get((category.id, code), FIRST_TICKET)
+        end = start + size - 1
+        next_ticket[(category.id, code)] = end + 1 + (rng.randint(1, 50) if rng.random() < 0.2 else 0)
+
+        # Sales carve up to four disjoint pieces out of the block
+        cuts = sorted(rng.sample(range(start + 1, end), rng.randint(0, 4) * 2))
+        sold = [(cuts[i], cuts[i + 1]) for i in range(0, len(cuts), 2)]
+
+        # Every fragment belongs to the delivery's purchase row, the first one (origin_id NULL)
+        purchase_id = stock_count + 1
+        fragments = []
+        cursor = start
+        for sold_start, sold_end in sold:
+            sale_count += 1
+            sale_date = min(day + timedelta(days=rng.randint(0, 30)), HISTORY_START + timedelta(days=HISTORY_DAYS - 1))
+            quantity = (sold_end - sold_start + 1) * denomination
+            sales.append(dict(_ticket_fields(sold_start, sold_end), id=sale_count, category_id=category.id,
+                              party_id=rng.choice(parties).id, entry_date=sale_date, ticket_code=code,
+                              quantity=quantity, rate=category.sale_rate, amount=category.sale_rate * quantity,
+                              created_by=user.id))
+            allocations.append({'sale_entry_id': sale_count, 'start_value': sold_start, 'end_value': sold_end,
+                                'quantity': quantity, 'distributor_id': distributor_id, 'rate': rate,
+                                'entry_date': day, 'notes': None, 'origin_id': purchase_id})
+            if sold_start > cursor:
+                fragments.append((cursor, sold_start - 1))
+            cursor = sold_end + 1
+        if cursor <= end:
+            fragments.append((cursor, end))
+
+        # The block's remaining fragments are the stock rows
+        for n, (fragment_start, fragment_end) in enumerate(fragments):
+            quantity = (fragment_end - fragment_start + 1) * denomination
+            stock.append(dict(_ticket_fields(fragment_start, fragment_end), id=purchase_id + n, category_id=category.id,
+                              distributor_id=distributor_id, entry_date=day, ticket_code=code,
+                              quantity=quantity, rate=rate, amount=rate * quantity, created_by=user.id,
+                              origin_id=purchase_id if n else None))
+        stock_count += len(fragments)
+
+        if len(stock) >= BATCH_ROWS:
+            _insert(StockEntry, stock)
+        if len(sales) >= BATCH_ROWS:
+            _insert(SaleEntry, sales)
+            _insert(SaleAllocation, allocations)
+
+    _insert(StockEntry, stock)
+    _insert(SaleEntry, sales)
+    _insert(SaleAllocation, allocations)
+    rebuild_stock_balance()
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+    return {
+        'seed': seed,
+        'stock_rows': stock_count,
+        'sale_rows': sale_count,
+        'user_id': user.id,
+        'category_ids': [c.id for c in categories],
+        'codes': codes,
+        'first_day': HISTORY_START,
+        'last_day': HISTORY_START + timedelta(days=HISTORY_DAYS - 1)
+    }
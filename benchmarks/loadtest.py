@@ -0,0 +1,308 @@
+"""
+HTTP load test against a running LOT server.
+
+Each simulated clerk is a thread with its own login session (POST /login) that replays a
+mix of purchase posts, sale posts, /api/check-stock-range calls and dashboard polls for a
+fixed duration. Latency percentiles, throughput, errors and "database is locked" failures
+are reported per endpoint.
+
+Scenarios:
+    mixed         every clerk works its own category/code: 10% purchases, 30% sales,
+                  40% stock-range checks, 20% dashboard polls
+    counter-rush  every clerk sells consecutive ranges from the same category and code,
+                  so all writes land on the same stock lot (month-end counter rush)
+
+By default a scratch server (its own temporary database, seeded through the API) is started
+in a subprocess with the same serving code as run_app.py (--server picks the WSGI server). Use --url with --username/--password to target a server that is already
+running instead; note that the test posts real purchases and sales to it.
+
+Usage:
+    python -m benchmarks.loadtest [--scenario mixed|counter-rush] [--clerks 8] [--duration 30]
+                                  [--server auto|waitress|gunicorn|werkzeug]
+                                  [--url http://127.0.0.1:52741 --username U --password P]
+                                  [--output results.json]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date
+from http.cookiejar import CookieJar
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CATEGORIES = ('M5', 'M10', 'D25', 'E50')
+LOT_SIZE = 1000000  # Tickets per seeded stock lot
+FIRST_TICKET = 1000000
+MIXED_WEIGHTS = (('purchase', 10), ('sale', 30), ('check', 40), ('dashboard', 20))
+ENDPOINT_NAMES = {
+    'purchase': 'POST /api/stock-entries',
+    'sale': 'POST /api/sale-entries',
+    'check': 'POST /api/check-stock-range',
+    'dashboard': 'GET /api/dashboard/summary'
+}
+
+
+class Client:
+    """One clerk's HTTP session (cookies kept between requests)."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method, path, payload=None, timeout=60):
+        """Return (status, body text); HTTP errors are returned, not raised."""
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.opener.open(req, timeout=timeout) as response:
+                return response.status, response.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+    def json(self, method, path, payload=None):
+        status, body = self.request(method, path, payload)
+        if status != 200:
+            raise RuntimeError(f'{method} {path} failed with {status}: {body[:200]}')
+        return json.loads(body)
+
+
+# Scratch server ---------------------------------------------------------------------------------
+
+def serve(port):
+    """Entry point of the scratch server subprocess."""
+    sys.path.insert(0, REPO_DIR)
+    from app import app, upgrade_database, serve as serve_app
+    with app.app_context():
+        upgrade_database()
+    serve_app('127.0.0.1', port)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/', timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.05)
+    raise RuntimeError(f'Server at {base_url} did not become ready')
+
+
+def start_scratch_server(server):
+    """Start a server on a temporary database; returns (process, base_url)."""
+    port = free_port()
+    env = dict(os.environ, LOT_SERVER=server,
+               LOT_DATABASE_URI='sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='lot-load-'), 'load.db'),
+               LOT_STOCK_COMPACT_INTERVAL='0')
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.loadtest', '--serve', str(port)],
+                               cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    wait_until_ready(base_url)
+    return process, base_url
+
+
+def seed(client, clerks, today):
+    """Create categories, a distributor, parties and one large stock lot per clerk (plus the rush lot)."""
+    for name in CATEGORIES:
+        client.json('POST', '/api/categories', {'name': name, 'purchase_rate': 1, 'sale_rate': 1.1})
+    client.json('POST', '/api/distributors', {'name': 'Load Distributor'})
+    for i in range(10):
+        client.json('POST', '/api/parties', {'name': f'Load Party {i + 1}'})
+    categories = {c['name']: c['id'] for c in client.json('GET', '/api/categories')}
+    distributor_id = client.json('GET', '/api/distributors')[0]['id']
+
+    entries = [{'category_id': categories[CATEGORIES[i % len(CATEGORIES)]], 'ticket_code': f'L{i:02d}',
+                'start_number': str(FIRST_TICKET), 'end_number': str(FIRST_TICKET + LOT_SIZE - 1)}
+               for i in range(clerks)]
+    entries.append({'category_id': categories[CATEGORIES[0]], 'ticket_code': 'RUSH',
+                    'start_number': str(FIRST_TICKET), 'end_number': str(FIRST_TICKET + LOT_SIZE - 1)})
+    client.json('POST', '/api/stock-entries/import',
+                {'entries': entries, 'entry_date': today, 'distributor_id': distributor_id})
+
+
+# Workload ---------------------------------------------------------------------------------------
+
+class Recorder:
+    """Thread-safe latency and error counters per endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, seconds, status, body):
+        locked = 'database is locked' in body
+        with self.lock:
+            stats = self.samples.setdefault(endpoint, {'latencies': [], 'errors': 0, 'lock_errors': 0})
+            stats['latencies'].append(seconds)
+            if status >= 400:
+                stats['errors'] += 1
+            if locked:
+                stats['lock_errors'] += 1
+
+    def report(self, duration):
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0
+
+        report = {}
+        for endpoint, stats in sorted(self.samples.items()):
+            latencies = sorted(stats['latencies'])
+            report[endpoint] = {
+                'requests': len(latencies),
+                'throughput_rps': round(len(latencies) / duration, 1),
+                'errors': stats['errors'],
+                'lock_errors': stats['lock_errors'],
+                'p50_ms': round(percentile(latencies, 0.50), 1),
+                'p95_ms': round(percentile(latencies, 0.95), 1),
+                'p99_ms': round(percentile(latencies, 0.99), 1)
+            }
+        return report
+
+
+def clerk(index, args, context, recorder, stop):
+    client = Client(context['base_url'])
+    client.json('POST', '/login', {'username': context['username'], 'password': context['password']})
+    rng = random.Random(index)
+    today = context['today']
+    category_id = context['categories'][CATEGORIES[index % len(CATEGORIES)]]
+    own_code = f'L{index:02d}'
+    # Sales walk through this clerk's lot; purchases extend a code of its own
+    sale_cursor = itertools.count(FIRST_TICKET, 20)
+    purchase_cursor = itertools.count(FIRST_TICKET, 100)
+    actions = [name for name, weight in MIXED_WEIGHTS for _ in range(weight)]
+
+    while not stop.is_set():
+        if args.scenario == 'counter-rush':
+            action = 'sale' if rng.random() < 0.9 else 'check'
+        else:
+            action = rng.choice(actions)
+
+        if action == 'purchase':
+            start = next(purchase_cursor)
+            payload = {'category_id': category_id, 'distributor_id': context['distributor_id'],
+                       'ticket_code': f'P{index:02d}', 'start_number': str(start), 'end_number': str(start + 99),
+                       'quantity': 100, 'rate': 1, 'entry_date': today}
+            call = ('POST', '/api/stock-entries', payload)
+        elif action == 'sale':
+            if args.scenario == 'counter-rush':
+                start, code, sale_category = next(context['rush_cursor']), 'RUSH', context['categories'][CATEGORIES[0]]
+            else:
+                start, code, sale_category = next(sale_cursor), own_code, category_id
+            payload = {'category_id': sale_category, 'party_id': rng.choice(context['party_ids']), 'ticket_code': code,
+                       'start_number': str(start), 'end_number': str(start + rng.randint(0, 9)), 'entry_date': today}
+            call = ('POST', '/api/sale-entries', payload)
+        elif action == 'check':
+            start = FIRST_TICKET + rng.randrange(LOT_SIZE - 100)
+            payload = {'category_id': category_id, 'start_number': str(start), 'end_number': str(start + 9),
+                       'sale_date': today}
+            call = ('POST', '/api/check-stock-range', payload)
+        else:
+            call = ('GET', f'/api/dashboard/summary?date={today}', None)
+
+        began = time.perf_counter()
+        try:
+            status, body = client.request(*call)
+        except (urllib.error.URLError, ConnectionError, socket.timeout) as e:
+            status, body = 599, str(e)
+        recorder.record(ENDPOINT_NAMES[action], time.perf_counter() - began, status, body)
+        if args.think_ms:
+            time.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=('mixed', 'counter-rush'), default='mixed')
+    parser.add_argument('--clerks', type=int, default=8, help='Concurrent simulated clerks')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--think-ms', type=float, default=0, help='Mean pause between a clerk\'s requests')
+    parser.add_argument('--server', default=os.environ.get('LOT_SERVER', 'auto'),
+                        help='LOT_SERVER for the scratch server (auto, waitress, gunicorn or werkzeug)')
+    parser.add_argument('--url', help='Base URL of a running server (default: start a scratch server)')
+    parser.add_argument('--username', default='loadtest')
+    parser.add_argument('--password', default='loadtest')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    process = None
+    today = date.today().isoformat()
+    if args.url:
+        base_url = args.url.rstrip('/')
+        admin = Client(base_url)
+        admin.json('POST', '/login', {'username': args.username, 'password': args.password})
+    else:
+        process, base_url = start_scratch_server(args.server)
+        admin = Client(base_url)
+        admin.json('POST', '/register', {'username': args.username, 'password': args.password})
+        seed(admin, args.clerks, today)
+
+    try:
+        categories = {c['name']: c['id'] for c in admin.json('GET', '/api/categories')}
+        missing = [name for name in CATEGORIES if name not in categories]
+        if missing:
+            sys.exit(f'Categories {", ".join(missing)} are missing on {base_url}')
+        context = {
+            'base_url': base_url,
+            'username': args.username,
+            'password': args.password,
+            'today': today,
+            'categories': categories,
+            'distributor_id': admin.json('GET', '/api/distributors')[0]['id'],
+            'party_ids': [p['id'] for p in admin.json('GET', '/api/parties')],
+            'rush_cursor': itertools.count(FIRST_TICKET, 10)
+        }
+
+        recorder = Recorder()
+        stop = threading.Event()
+        threads = [threading.Thread(target=clerk, args=(i, args, context, recorder, stop), daemon=True)
+                   for i in range(args.clerks)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = recorder.report(elapsed)
+    total = sum(stats['requests'] for stats in report.values())
+    print(f"{args.scenario}: {args.clerks} clerks for {elapsed:.1f}s, {total} requests ({total / elapsed:.1f}/s)")
+    print(f"{'endpoint':<30} {'requests':>9} {'req/s':>8} {'errors':>7} {'locked':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, stats in report.items():
+        print(f"{endpoint:<30} {stats['requests']:>9} {stats['throughput_rps']:>8.1f} {stats['errors']:>7} "
+              f"{stats['lock_errors']:>7} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'scenario': args.scenario, 'clerks': args.clerks, 'duration': round(elapsed, 1),
+                       'endpoints': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+Benchmark suite for the key stock paths at increasing data sizes.
+
+For each size the database is regenerated with benchmarks.datagen (same seed, same data),
+then the suite times:
+
+- check_overlapping_range, the covering-lots lookup of the sale path and the availability index on random probes
+- deduct_from_stock and restore_to_stock (each followed by a flush, rolled back afterwards)
+- the listing endpoints, the dashboard summary and export_csv through the test client
+
+Results are printed and written as JSON (--output). Pass --baseline with the JSON from an
+earlier commit to print the change per metric.
+
+Usage:
+    python -m benchmarks.suite [--sizes 10000,100000,1000000] [--output results.json]
+                               [--baseline previous.json] [--seed 2026]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the app at a scratch database before it is imported
+_tmp_dir = tempfile.mkdtemp(prefix='lot-suite-')
+os.environ['LOT_DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp_dir, 'suite.db')
+os.environ.setdefault('LOT_STOCK_COMPACT_INTERVAL', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, StockEntry, SaleEntry, upgrade_database, reference_row, check_overlapping_range,
+                 deduct_from_stock, restore_to_stock, availability_index)
+from benchmarks.bench_range_index import find_covering_lots
+from benchmarks.datagen import generate, BENCH_USERNAME, BENCH_PASSWORD
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(samples):
+    """Timing stats in microseconds for a list of durations in seconds."""
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'mean_us': round(statistics.fmean(samples) * 1e6, 1),
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 1),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6, 1)
+    }
+
+
+def random_ids(model, count, rng):
+    """Up to `count` random primary keys of a table."""
+    max_id = db.session.query(db.func.max(model.id)).scalar() or 0
+    ids = set()
+    for _ in range(count * 4):
+        if len(ids) >= count:
+            break
+        candidate = rng.randint(1, max_id) if max_id else 0
+        if db.session.get(model, candidate) is not None:
+            ids.add(candidate)
+    db.session.expire_all()
+    return sorted(ids)
+
+
+def bench_lookups(rng, lookups):
+    """Overlap and containment checks inside and around existing stock lots."""
+    probes = []
+    for stock_id in random_ids(StockEntry, lookups, rng):
+        lot = db.session.get(StockEntry, stock_id)
+        start = rng.randint(lot.start_value, lot.end_value)
+        probes.append((lot.category_id, lot.ticket_code, start, min(lot.end_value, start + rng.randint(0, 20))))
+    db.session.expire_all()
+
+    # Load the probed categories into the availability index before timing it
+    for category_id in {probe[0] for probe in probes}:
+        availability_index.covering(category_id, None, 0, 0)
+
+    results = {}
+    for name, func in (('check_overlapping_range', check_overlapping_range),
+                       ('find_covering_lots', find_covering_lots),
+                       ('availability_covering', availability_index.covering)):
+        samples = []
+        for category_id, code, start, end in probes:
+            began = time.perf_counter()
+            func(category_id, code, start, end)
+            samples.append(time.perf_counter() - began)
+        results[name] = summarize(samples)
+        db.session.expire_all()
+    return results
+
+
+def bench_mutations(rng, count):
+    """deduct_from_stock on random lots and restore_to_stock on random sales, then roll back."""
+    samples = []
+    for stock_id in random_ids(StockEntry, count, rng):
+        lot = db.session.get(StockEntry, stock_id)
+        category = reference_row('category', lot.category_id)
+        ticket = rng.randint(lot.start_value, lot.end_value)
+        began = time.perf_counter()
+        deduct_from_stock(lot, ticket, ticket, category)
+        db.session.flush()
+        samples.append(time.perf_counter() - began)
+    db.session.rollback()
+    results = {'deduct_from_stock': summarize(samples)}
+
+    samples = []
+    for sale_id in random_ids(SaleEntry, count, rng):
+        sale = db.session.get(SaleEntry, sale_id)
+        began = time.perf_counter()
+        restore_to_stock(sale)
+        db.session.delete(sale)
+        db.session.flush()
+        samples.append(time.perf_counter() - began)
+    db.session.rollback()
+    results['restore_to_stock'] = summarize(samples)
+    return results
+
+
+def bench_endpoints(client, summary, repeat):
+    """Listing, dashboard and export requests; each body is read in full."""
+    day = summary['last_day'] - timedelta(days=10)
+    month_start = day.replace(day=1)
+    endpoints = {
+        'stock_entries_first_page': '/api/stock-entries?limit=200',
+        'stock_entries_by_date': f'/api/stock-entries?date={day}',
+        'sale_entries_first_page': '/api/sale-entries?limit=200',
+        'sale_entries_by_party_date': f'/api/sale-entries?date={day}&party_id=1',
+        'dashboard_summary': f'/api/dashboard/summary?date={day}',
+        'export_sales_month': f'/api/export-csv?type=sale&date_from={month_start}&date_to={day}',
+        'export_stock_full': '/api/export-csv?type=stock'
+    }
+    results = {}
+    for name, url in endpoints.items():
+        runs = 1 if name == 'export_stock_full' else repeat
+        samples = []
+        for _ in range(runs):
+            began = time.perf_counter()
+            response = client.get(url)
+            body = response.get_data()
+            samples.append(time.perf_counter() - began)
+            assert response.status_code == 200, (url, response.status_code)
+        results[name] = dict(summarize(samples), bytes=len(body))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """Print the change in mean time per metric against an earlier results file."""
+    print(f"\nChange vs baseline {baseline['meta'].get('commit') or '(unknown commit)'}:")
+    for size, metrics in current['results'].items():
+        for name, stats in metrics.items():
+            before = baseline['results'].get(size, {}).get(name)
+            if not before or not before.get('mean_us') or name in ('generate', 'rows'):
+                continue
+            change = (stats['mean_us'] - before['mean_us']) / before['mean_us'] * 100
+            print(f"{size:>9}  {name:<28} {before['mean_us']:>12.1f} -> {stats['mean_us']:>12.1f} us  {change:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma separated stock row counts')
+    parser.add_argument('--seed', type=int, default=2026, help='Data generator seed')
+    parser.add_argument('--lookups', type=int, default=500, help='Range lookups timed per size')
+    parser.add_argument('--mutations', type=int, default=200, help='Deducts and restores timed per size')
+    parser.add_argument('--repeat', type=int, default=5, help='Requests timed per endpoint')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Results JSON from an earlier run to compare against')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed
+        },
+        'results': {}
+    }
+
+    with app.app_context():
+        upgrade_database()
+        client = app.test_client()
+        for size in [int(s) for s in args.sizes.split(',')]:
+            began = time.perf_counter()
+            summary = generate(size, seed=args.seed)
+            generated = time.perf_counter() - began
+            client.post('/login', json={'username': BENCH_USERNAME, 'password': BENCH_PASSWORD})
+
+            rng = random.Random(f'{args.seed}:{size}:probes')
+            results = {
+                'rows': {'stock': summary['stock_rows'], 'sale': summary['sale_rows']},
+                'generate': {'seconds': round(generated, 2)}
+            }
+            results.update(bench_lookups(rng, args.lookups))
+            results.update(bench_mutations(rng, args.mutations))
+            results.update(bench_endpoints(client, summary, args.repeat))
+            report['results'][str(size)] = results
+
+            print(f"\n{size} stock rows ({summary['stock_rows']} stock, {summary['sale_rows']} sales, "
+                  f"generated in {generated:.1f}s)")
+            for name, stats in results.items():
+                if 'mean_us' in stats:
+                    print(f"  {name:<28} mean {stats['mean_us']:>12.1f} us   p95 {stats['p95_us']:>12.1f} us")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResults written to {args.output}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
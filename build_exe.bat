@@ -32,6 +32,16 @@ if exist "dist\LOT.exe" (
     echo   The database will be created in the same
     echo   folder as the exe file.
     echo ================================================
+) else if exist "dist\LOT\LOT.exe" (
+    echo ================================================
+    echo   BUILD SUCCESSFUL! ^(folder build, LOT_ONEDIR=1^)
+    echo ================================================
+    echo.
+    echo   Your app is ready at:
+    echo   dist\LOT\LOT.exe
+    echo.
+    echo   Copy the whole dist\LOT folder to install it.
+    echo ================================================
 ) else (
     echo ================================================
     echo   BUILD FAILED!
@@ -2,13 +2,17 @@
 LOT - Lottery Ticket Management System
 Portable Application with Native Window (using Chrome/Edge app mode)
 """
+import time
+
+# Startup phases are timed from here (the interpreter itself is not included)
+STARTUP_BEGAN = time.perf_counter()
+
 import sys
 import os
 import threading
-import time
-import subprocess
-import webbrowser
 import socket
+import urllib.error
+import urllib.request
 
 # Unique port for LOT app (uncommon port to avoid conflicts)
 # Avoids: 3000, 5000, 5173, 8000, 8080, 4200 etc.
@@ -29,7 +33,8 @@ else:
 os.chdir(APP_DIR)
 
 # Now import Flask app
-from app import app, db
+from app import app, logger, upgrade_database, check_sqlite_pragmas, serve
+IMPORTED = time.perf_counter()
 
 def find_free_port(start_port):
     """Find a free port starting from start_port"""
@@ -64,12 +69,38 @@ def find_browser():
     
     return None
 
-def start_flask(port):
-    """Start Flask server on specified port"""
-    app.run(host='127.0.0.1', port=port, debug=False, use_reloader=False, threaded=True)
+def wait_for_server(url, timeout=30):
+    """Poll url until the server answers; returns False if it does not within timeout seconds"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except urllib.error.HTTPError:
+            return True  # Any HTTP response means the server is up
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.02)
+    return False
+
+def open_when_ready(url, phases, open_window=True):
+    """Open the app window as soon as the server answers and log the startup phase timings"""
+    serving_began = time.perf_counter()
+    if not wait_for_server(url):
+        print(f"Server did not start at {url}")
+        return
+    phases['first response'] = time.perf_counter() - serving_began
+    total = time.perf_counter() - STARTUP_BEGAN
+    logger.info("Startup: " + ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in phases.items())
+                + f", total {total * 1000:.0f} ms ({url})")
+    if open_window:
+        open_app_window(url)
 
 def open_app_window(url):
     """Open browser in app mode (no toolbar/address bar)"""
+    # Only needed once the server is up, so they stay out of the startup path
+    import subprocess
+    import webbrowser
+    
     browser_path = find_browser()
     
     if browser_path:
@@ -99,28 +130,29 @@ def open_app_window(url):
     return False
 
 if __name__ == '__main__':
-    # Create database tables if they don't exist
+    phases = {'import': IMPORTED - STARTUP_BEGAN}
+    
+    # Open the database, then create its tables or migrate it if the stored schema version is older
     with app.app_context():
-        db.create_all()
+        began = time.perf_counter()
+        check_sqlite_pragmas()
+        phases['database open'] = time.perf_counter() - began
+        
+        began = time.perf_counter()
+        upgrade_database()
+        phases['schema check'] = time.perf_counter() - began
     
     # Find a free port (starts with APP_PORT, increments if busy)
     port = find_free_port(APP_PORT)
+    url = f'http://127.0.0.1:{port}'
     
-    # Start Flask server in background thread
-    server_thread = threading.Thread(target=start_flask, args=(port,), daemon=True)
-    server_thread.start()
-    
-    # Wait for server to start
-    time.sleep(1.5)
-    
-    # Open the app in a native-like window
-    open_app_window(f'http://127.0.0.1:{port}')
+    # Open the app in a native-like window once the server is up (--no-window: serve only)
+    threading.Thread(target=open_when_ready, args=(url, phases, '--no-window' not in sys.argv), daemon=True).start()
     
-    # Keep the main thread alive
+    # Serve in the main thread until interrupted
     print("LOT is running. Close the browser window to exit.")
     try:
-        while True:
-            time.sleep(1)
+        serve('127.0.0.1', port)
     except KeyboardInterrupt:
-        print("Shutting down...")
-    webview.start()
+        pass
+    print("Shutting down...")
@@ -5,6 +5,150 @@ let editingPartyId = null;
 let categoriesData = [];
 let distributorsData = [];
 let partiesData = [];
+let stockNextAfterId = null;
+let stockLoadedCount = 0;
+
+// Rows fetched per page by paginated listings
+const ENTRY_PAGE_SIZE = 200;
+
+// Conditional GET cache for the read APIs: the last ETag and body per URL, revalidated with
+// If-None-Match so unchanged data comes back as an empty 304 instead of the full JSON
+const RESPONSE_CACHE_LIMIT = 50;
+const responseCache = new Map();
+
+async function cachedFetch(url) {
+    const cached = responseCache.get(url);
+    const response = await fetch(url, cached ? { headers: { 'If-None-Match': cached.etag } } : {});
+    
+    if (response.status === 304 && cached) {
+        // Most recently used entries stay at the end of the map
+        responseCache.delete(url);
+        responseCache.set(url, cached);
+        return new Response(cached.body, { status: 200, headers: cached.headers });
+    }
+    
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        responseCache.delete(url);
+        responseCache.set(url, { etag, body: await response.clone().text(), headers: new Headers(response.headers) });
+        if (responseCache.size > RESPONSE_CACHE_LIMIT) {
+            responseCache.delete(responseCache.keys().next().value);
+        }
+    }
+    return response;
+}
+
+// Live updates: the server pushes one 'change' event per committed write over /api/events.
+// Events arriving close together are batched, then only the views showing a changed table
+// are reloaded (through cachedFetch, so unchanged pages cost a 304).
+const CHANGE_BATCH_DELAY = 150;
+const ALL_TABLES = ['category', 'distributor', 'party', 'stock_entry', 'sale_entry'];
+const CHANGE_POLL_INTERVAL = 30000;
+const CHANGE_STREAM_RETRY_DELAY = 60000;
+let changedTables = new Set();
+let changeRefreshTimer = null;
+let changePollTimer = null;
+
+// Refresh the stock and sale views every 30 seconds while there is no live-update stream
+function startChangePolling() {
+    if (!changePollTimer) {
+        changePollTimer = setInterval(() => queueTableRefresh(['stock_entry', 'sale_entry']), CHANGE_POLL_INTERVAL);
+    }
+}
+
+function stopChangePolling() {
+    clearInterval(changePollTimer);
+    changePollTimer = null;
+}
+
+function connectChangeEvents() {
+    if (!window.EventSource) {
+        startChangePolling();
+        return;
+    }
+    
+    // EventSource reconnects by itself and resumes from the last event id. It gives up (CLOSED)
+    // when the server refuses the stream, e.g. with a 503 because too many windows are open;
+    // then poll, and try the stream again a minute later.
+    const source = new EventSource('/api/events');
+    source.addEventListener('open', stopChangePolling);
+    source.addEventListener('change', e => {
+        const { changes } = JSON.parse(e.data);
+        queueTableRefresh(changes.map(change => change.table));
+    });
+    source.addEventListener('resync', () => queueTableRefresh(ALL_TABLES));
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) {
+            startChangePolling();
+            setTimeout(connectChangeEvents, CHANGE_STREAM_RETRY_DELAY);
+        }
+    });
+}
+
+function queueTableRefresh(tables) {
+    tables.forEach(table => changedTables.add(table));
+    if (!changeRefreshTimer) {
+        changeRefreshTimer = setTimeout(refreshChangedViews, CHANGE_BATCH_DELAY);
+    }
+}
+
+function isTabActive(tabId) {
+    return document.getElementById(tabId)?.classList.contains('active');
+}
+
+// Reload a view unless the user is editing a row in it
+function refreshUnlessEditing(tbodyId, load) {
+    if (!document.querySelector(`#${tbodyId} .inline-edit-input`)) {
+        load();
+    }
+}
+
+// Reload reference data without losing what is selected in the entry forms
+async function refreshKeepingSelection(selectIds, load) {
+    const selected = selectIds.map(id => [id, document.getElementById(id)?.value]);
+    await load();
+    selected.forEach(([id, value]) => {
+        const select = document.getElementById(id);
+        if (select && value) select.value = value;
+    });
+}
+
+async function refreshChangedViews() {
+    const tables = changedTables;
+    changedTables = new Set();
+    changeRefreshTimer = null;
+    
+    if (tables.has('category')) {
+        await refreshKeepingSelection(['categorySelect', 'saleCategorySelect'], async () => {
+            await loadCategories();
+            loadSaleCategories();
+        });
+    }
+    if (tables.has('distributor')) {
+        await refreshKeepingSelection(['distributorSelect'], loadDistributors);
+    }
+    if (tables.has('party')) {
+        await refreshKeepingSelection(['salePartySelect'], async () => {
+            await loadParties();
+            loadSaleParties();
+        });
+    }
+    
+    const stockChanged = tables.has('stock_entry') || tables.has('category') || tables.has('distributor');
+    const salesChanged = tables.has('sale_entry') || tables.has('category') || tables.has('party');
+    if ((stockChanged || salesChanged) && isTabActive('dashboard-tab')) {
+        loadStats();
+    }
+    if (stockChanged && isTabActive('view-stock-tab')) {
+        loadStockEntries(false, true);
+    }
+    if (stockChanged) {
+        refreshUnlessEditing('sessionEntriesBody', loadSessionEntries);
+    }
+    if (salesChanged) {
+        refreshUnlessEditing('saleSessionEntriesBody', loadSaleSessionEntries);
+    }
+}
 
 // Disable right-click context menu
 document.addEventListener('contextmenu', function(e) {
@@ -132,13 +276,8 @@ document.addEventListener('DOMContentLoaded', async () => {
         await loadUsers();
     }
     
-    // Auto-refresh dashboard every 30 seconds when on dashboard tab
-    setInterval(() => {
-        const dashboardTab = document.getElementById('dashboard-tab');
-        if (dashboardTab && dashboardTab.classList.contains('active')) {
-            loadStats();
-        }
-    }, 30000);
+    // Refresh views when other windows commit changes (replaces the 30 second dashboard poll)
+    connectChangeEvents();
     
     // Event listeners
     document.getElementById('stockForm').addEventListener('submit', handleAddStockEntry);
@@ -311,7 +450,7 @@ function clearStockForm() {
 
 async function checkAdminStatus() {
     try {
-        const response = await fetch('/api/user-info');
+        const response = await cachedFetch('/api/user-info');
         const data = await response.json();
         
         isAdmin = data.is_admin;
@@ -334,7 +473,7 @@ async function checkAdminStatus() {
 
 async function loadCategories() {
     try {
-        const response = await fetch('/api/categories');
+        const response = await cachedFetch('/api/categories');
         const categories = await response.json();
         
         // Store globally for denomination lookup
@@ -360,7 +499,7 @@ async function loadCategories() {
 
 async function loadDistributors() {
     try {
-        const response = await fetch('/api/distributors');
+        const response = await cachedFetch('/api/distributors');
         const distributors = await response.json();
         
         // Store globally
@@ -472,7 +611,7 @@ function editDistributor(id, name) {
 // Party Management Functions
 async function loadParties() {
     try {
-        const response = await fetch('/api/parties');
+        const response = await cachedFetch('/api/parties');
         const parties = await response.json();
         
         // Store globally
@@ -907,22 +1046,56 @@ async function submitStockEntry() {
     }
 }
 
-async function loadStockEntries() {
+// Build a listing URL with server-side filters (empty values are skipped)
+function buildListingUrl(path, filters = {}) {
+    const params = new URLSearchParams();
+    Object.entries(filters).forEach(([key, value]) => {
+        if (value !== undefined && value !== null && value !== '') {
+            params.append(key, value);
+        }
+    });
+    const query = params.toString();
+    return query ? `${path}?${query}` : path;
+}
+
+// Fetch one keyset page of a listing; nextAfterId is null on the last page
+async function fetchEntryPage(path, filters = {}, afterId = null, limit = ENTRY_PAGE_SIZE) {
+    const response = await cachedFetch(buildListingUrl(path, { ...filters, limit, after_id: afterId }));
+    const entries = await response.json();
+    return { entries, nextAfterId: response.headers.get('X-Next-After-Id') };
+}
+
+// Fetch pages from the start until at least `count` rows (or the whole listing) are loaded
+async function fetchEntryPages(path, filters, count) {
+    let { entries, nextAfterId } = await fetchEntryPage(path, filters);
+    while (nextAfterId && entries.length < count) {
+        const page = await fetchEntryPage(path, filters, nextAfterId);
+        entries = entries.concat(page.entries);
+        nextAfterId = page.nextAfterId;
+    }
+    return { entries, nextAfterId };
+}
+
+// append: add the next page; keepLoaded: reload in place with as many rows as are shown
+// (used when another window changed stock, so "Load more" pages and the scroll position stay)
+async function loadStockEntries(append = false, keepLoaded = false) {
     const dateFilter = document.getElementById('filterDate')?.value;
     
     try {
-        const url = '/api/stock-entries' + (dateFilter ? `?date=${dateFilter}` : '');
-        const response = await fetch(url);
-        const entries = await response.json();
+        const { entries, nextAfterId } = append === true
+            ? await fetchEntryPage('/api/stock-entries', { date: dateFilter }, stockNextAfterId)
+            : await fetchEntryPages('/api/stock-entries', { date: dateFilter }, keepLoaded ? stockLoadedCount : 0);
+        stockNextAfterId = nextAfterId;
+        stockLoadedCount = (append === true ? stockLoadedCount : 0) + entries.length;
         
         const tbody = document.getElementById('stockBody');
         
-        if (entries.length === 0) {
+        if (append !== true && entries.length === 0) {
             tbody.innerHTML = '<tr><td colspan="10" style="text-align:center; padding: 20px;">No entries found</td></tr>';
             return;
         }
         
-        tbody.innerHTML = entries.map(entry => `
+        const rowsHtml = entries.map(entry => `
             <tr>
                 <td>${entry.date}</td>
                 <td>${entry.distributor || '-'}</td>
@@ -939,6 +1112,23 @@ async function loadStockEntries() {
                 </td>
             </tr>
         `).join('');
+        
+        document.getElementById('stockLoadMoreRow')?.remove();
+        if (append === true) {
+            tbody.insertAdjacentHTML('beforeend', rowsHtml);
+        } else {
+            tbody.innerHTML = rowsHtml;
+        }
+        
+        if (nextAfterId) {
+            tbody.insertAdjacentHTML('beforeend', `
+                <tr id="stockLoadMoreRow">
+                    <td colspan="10" style="text-align:center; padding: 10px;">
+                        <button class="btn-secondary btn-sm" onclick="loadStockEntries(true)">Load more</button>
+                    </td>
+                </tr>
+            `);
+        }
     } catch (error) {
         console.error('Error loading stock entries:', error);
     }
@@ -964,7 +1154,7 @@ async function loadSessionEntries() {
         if (distributorId) params.push(`distributor_id=${distributorId}`);
         if (params.length > 0) url += '?' + params.join('&');
         
-        const response = await fetch(url);
+        const response = await cachedFetch(url);
         const entries = await response.json();
         
         const tbody = document.getElementById('sessionEntriesBody');
@@ -1302,17 +1492,39 @@ function clearDateFilter() {
 
 async function exportToCSV() {
     const dateFilter = document.getElementById('exportDate')?.value;
-    const url = '/api/export-csv' + (dateFilter ? `?date=${dateFilter}` : '');
-    
+    await downloadExportCSV({ date: dateFilter });
+}
+
+// ==================== EXPORT & PRINT FUNCTIONS ====================
+
+// CSV files are built and streamed by the server (/api/export-csv). The filters are checked first
+// (check=1) so an error or an empty export shows a toast, then the file is downloaded through a
+// hidden link, which never navigates away from the app page.
+async function downloadExportCSV(filters) {
     try {
-        window.location.href = url;
+        const response = await fetch(buildListingUrl('/api/export-csv', { ...filters, check: 1 }));
+        const result = await response.json();
+        if (!response.ok || !result.success) {
+            showToast('Error exporting: ' + result.message, 'error');
+            return;
+        }
+        if (result.empty) {
+            showToast('No entries to export', 'error');
+            return;
+        }
+        
+        const link = document.createElement('a');
+        link.href = buildListingUrl('/api/export-csv', filters);
+        link.download = '';
+        link.style.display = 'none';
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
     } catch (error) {
-        showToast('Error exporting CSV: ' + error.message, 'error');
+        showToast('Error exporting: ' + error.message, 'error');
     }
 }
 
-// ==================== EXPORT & PRINT FUNCTIONS ====================
-
 // Export Purchase entries to CSV
 async function exportPurchaseCSV() {
     const dateFilter = document.getElementById('entryDate').value;
@@ -1323,44 +1535,11 @@ async function exportPurchaseCSV() {
         return;
     }
     
-    try {
-        // Get session entries for the selected date and distributor
-        let url = `/api/stock-entries?date=${dateFilter}`;
-        if (distributorId) {
-            url += `&distributor_id=${distributorId}`;
-        }
-        
-        const response = await fetch(url);
-        const entries = await response.json();
-        
-        if (entries.length === 0) {
-            showToast('No entries to export', 'error');
-            return;
-        }
-        
-        // Get distributor name
-        const distributor = distributorsData.find(d => d.id == distributorId);
-        const distributorName = distributor ? distributor.name : 'All';
-        
-        // Create CSV content
-        let csv = 'Date,Distributor,Category,Code,Start Number,End Number,Quantity,Rate,Amount\n';
-        entries.forEach(entry => {
-            csv += `${entry.date},"${distributorName}","${entry.category}",${entry.ticket_code || ''},${entry.start_number},${entry.end_number},${entry.quantity},${entry.rate || 0},${entry.amount || 0}\n`;
-        });
-        
-        // Download CSV
-        const blob = new Blob([csv], { type: 'text/csv' });
-        const url2 = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url2;
-        a.download = `purchase_${dateFilter}_${distributorName.replace(/\s+/g, '_')}.csv`;
-        a.click();
-        window.URL.revokeObjectURL(url2);
-        
-        showToast('Purchase data exported successfully', 'success');
-    } catch (error) {
-        showToast('Error exporting: ' + error.message, 'error');
-    }
+    await downloadExportCSV({
+        type: 'purchase',
+        date: dateFilter,
+        distributor_id: distributorId
+    });
 }
 
 // Export Sale entries to CSV
@@ -1373,82 +1552,21 @@ async function exportSaleCSV() {
         return;
     }
     
-    try {
-        let url = `/api/sale-entries?date=${dateFilter}`;
-        if (partyId) {
-            url += `&party_id=${partyId}`;
-        }
-        
-        const response = await fetch(url);
-        const entries = await response.json();
-        
-        if (entries.length === 0) {
-            showToast('No entries to export', 'error');
-            return;
-        }
-        
-        // Get party name
-        const party = partiesData.find(p => p.id == partyId);
-        const partyName = party ? party.name : 'All';
-        
-        // Create CSV content
-        let csv = 'Date,Party,Category,Code,Start Number,End Number,Quantity,Rate,Amount\n';
-        entries.forEach(entry => {
-            csv += `${entry.date},"${partyName}","${entry.category}",${entry.ticket_code || ''},${entry.start_number},${entry.end_number},${entry.quantity},${entry.rate || 0},${entry.amount || 0}\n`;
-        });
-        
-        // Download CSV
-        const blob = new Blob([csv], { type: 'text/csv' });
-        const url2 = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url2;
-        a.download = `sale_${dateFilter}_${partyName.replace(/\s+/g, '_')}.csv`;
-        a.click();
-        window.URL.revokeObjectURL(url2);
-        
-        showToast('Sale data exported successfully', 'success');
-    } catch (error) {
-        showToast('Error exporting: ' + error.message, 'error');
-    }
+    await downloadExportCSV({
+        type: 'sale',
+        date: dateFilter,
+        party_id: partyId
+    });
 }
 
 // Export Stock entries to CSV
 async function exportStockCSV() {
     const dateFilter = document.getElementById('filterDate').value;
     
-    try {
-        let url = '/api/stock-entries';
-        if (dateFilter) {
-            url += `?date=${dateFilter}`;
-        }
-        
-        const response = await fetch(url);
-        const entries = await response.json();
-        
-        if (entries.length === 0) {
-            showToast('No entries to export', 'error');
-            return;
-        }
-        
-        // Create CSV content
-        let csv = 'Date,Distributor,Category,Code,Start Number,End Number,Quantity,Rate,Amount\n';
-        entries.forEach(entry => {
-            csv += `${entry.date},"${entry.distributor || ''}","${entry.category}",${entry.ticket_code || ''},${entry.start_number},${entry.end_number},${entry.quantity},${entry.rate || 0},${entry.amount || 0}\n`;
-        });
-        
-        // Download CSV
-        const blob = new Blob([csv], { type: 'text/csv' });
-        const url2 = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url2;
-        a.download = `stock_${dateFilter || 'all'}.csv`;
-        a.click();
-        window.URL.revokeObjectURL(url2);
-        
-        showToast('Stock data exported successfully', 'success');
-    } catch (error) {
-        showToast('Error exporting: ' + error.message, 'error');
-    }
+    await downloadExportCSV({
+        type: 'purchase',
+        date: dateFilter
+    });
 }
 
 // Print Purchase Report
@@ -1467,7 +1585,7 @@ async function printPurchaseReport() {
             url += `&distributor_id=${distributorId}`;
         }
         
-        const response = await fetch(url);
+        const response = await cachedFetch(url);
         const entries = await response.json();
         
         if (entries.length === 0) {
@@ -1500,7 +1618,7 @@ async function printSaleReport() {
             url += `&party_id=${partyId}`;
         }
         
-        const response = await fetch(url);
+        const response = await cachedFetch(url);
         const entries = await response.json();
         
         if (entries.length === 0) {
@@ -1527,7 +1645,7 @@ async function printStockReport() {
             url += `?date=${dateFilter}`;
         }
         
-        const response = await fetch(url);
+        const response = await cachedFetch(url);
         const entries = await response.json();
         
         if (entries.length === 0) {
@@ -1701,101 +1819,44 @@ async function loadStats() {
         });
         document.getElementById('dashboardDate').textContent = dateDisplay;
         
-        // Fetch all data
-        const [stockRes, catRes, saleRes, todayStockRes, todaySaleRes] = await Promise.all([
-            fetch('/api/stock-entries'),
-            fetch('/api/categories'),
-            fetch('/api/sale-entries'),
-            fetch(`/api/stock-entries?date=${dateStr}`),
-            fetch(`/api/sale-entries?date=${dateStr}`)
-        ]);
-        
-        const entries = await stockRes.json();
-        const categories = await catRes.json();
-        const sales = await saleRes.json();
-        const todayPurchases = await todayStockRes.json();
-        const todaySales = await todaySaleRes.json();
-        
-        // Calculate overall stats
-        let totalTickets = 0;
-        entries.forEach(entry => totalTickets += entry.quantity);
-        
-        document.getElementById('totalCategories').textContent = categories.length;
-        document.getElementById('totalEntries').textContent = entries.length;
-        document.getElementById('totalTickets').textContent = totalTickets.toLocaleString();
-        
-        // Calculate today's stats
-        let todayPurchaseQty = 0, todayPurchaseAmt = 0;
-        todayPurchases.forEach(e => {
-            todayPurchaseQty += e.quantity || 0;
-            todayPurchaseAmt += e.amount || 0;
-        });
+        // One aggregated request instead of downloading every entry
+        const response = await cachedFetch(`/api/dashboard/summary?date=${dateStr}`);
+        const summary = await response.json();
         
-        let todaySaleQty = 0, todaySaleAmt = 0;
-        todaySales.forEach(e => {
-            todaySaleQty += e.quantity || 0;
-            todaySaleAmt += e.amount || 0;
-        });
+        document.getElementById('totalCategories').textContent = summary.total_categories;
+        document.getElementById('totalEntries').textContent = summary.total_entries;
+        document.getElementById('totalTickets').textContent = summary.total_tickets.toLocaleString();
         
-        document.getElementById('todayPurchaseQty').textContent = todayPurchaseQty.toLocaleString();
-        document.getElementById('todaySaleQty').textContent = todaySaleQty.toLocaleString();
-        document.getElementById('todayPurchaseAmount').textContent = '₹' + todayPurchaseAmt.toLocaleString();
-        document.getElementById('todaySaleAmount').textContent = '₹' + todaySaleAmt.toLocaleString();
+        // Today's stats
+        document.getElementById('todayPurchaseQty').textContent = summary.today.purchase_quantity.toLocaleString();
+        document.getElementById('todaySaleQty').textContent = summary.today.sale_quantity.toLocaleString();
+        document.getElementById('todayPurchaseAmount').textContent = '₹' + summary.today.purchase_amount.toLocaleString();
+        document.getElementById('todaySaleAmount').textContent = '₹' + summary.today.sale_amount.toLocaleString();
         
         // Category-wise stock
-        const categoryStock = {};
-        categories.forEach(cat => categoryStock[cat.id] = { name: cat.name, qty: 0 });
-        entries.forEach(entry => {
-            if (categoryStock[entry.category_id]) {
-                categoryStock[entry.category_id].qty += entry.quantity;
-            }
-        });
-        
         const categoryGrid = document.getElementById('categoryStockGrid');
-        const catItems = Object.values(categoryStock);
+        const catItems = summary.category_stock;
         if (catItems.length === 0) {
             categoryGrid.innerHTML = '<p class="loading-text">No categories found</p>';
         } else {
             categoryGrid.innerHTML = catItems.map(cat => `
                 <div class="category-stock-item">
                     <span class="cat-name">${cat.name}</span>
-                    <span class="cat-qty">${cat.qty.toLocaleString()}</span>
+                    <span class="cat-qty">${cat.quantity.toLocaleString()}</span>
                 </div>
             `).join('');
         }
         
-        // Recent activity (last 10 transactions)
-        const allTransactions = [];
-        
-        // Add purchases with type
-        entries.slice(-20).forEach(e => {
-            allTransactions.push({
-                type: 'Purchase',
-                date: e.date,
-                category: e.category,
-                code: e.ticket_code || '-',
-                range: `${e.start_number} - ${e.end_number}`,
-                qty: e.quantity,
-                amount: e.amount || 0
-            });
-        });
-        
-        // Add sales with type
-        sales.slice(-20).forEach(e => {
-            allTransactions.push({
-                type: 'Sale',
-                date: e.date,
-                category: e.category,
-                code: e.ticket_code || '-',
-                range: `${e.start_number} - ${e.end_number}`,
-                qty: e.quantity,
-                amount: e.amount || 0
-            });
-        });
-        
-        // Sort by date descending and take last 10
-        allTransactions.sort((a, b) => new Date(b.date) - new Date(a.date));
-        const recentTx = allTransactions.slice(0, 10);
+        // Recent activity (latest 10 transactions, already sorted by date)
+        const recentTx = summary.recent.map(e => ({
+            type: e.type,
+            date: e.date,
+            category: e.category,
+            code: e.ticket_code || '-',
+            range: `${e.start_number} - ${e.end_number}`,
+            qty: e.quantity,
+            amount: e.amount || 0
+        }));
         
         const activityEl = document.getElementById('recentActivity');
         if (recentTx.length === 0) {
@@ -1874,7 +1935,7 @@ async function loadUsers() {
 // Print Report Functions
 async function loadPrintCategories() {
     try {
-        const response = await fetch('/api/categories');
+        const response = await cachedFetch('/api/categories');
         const categories = await response.json();
         
         const select = document.getElementById('printCategory');
@@ -1896,32 +1957,18 @@ async function getFilteredEntries() {
     const categoryFilter = document.getElementById('printCategory').value;
     
     try {
-        const response = await fetch('/api/stock-entries');
-        let entries = await response.json();
-        
-        // Get categories for display
-        const catResponse = await fetch('/api/categories');
-        const categories = await catResponse.json();
-        const categoryMap = {};
-        categories.forEach(c => categoryMap[c.id] = c.name);
-        
-        // Apply date filter
-        if (dateFilter) {
-            entries = entries.filter(e => e.date === dateFilter);
-        }
-        
-        // Apply category filter
-        if (categoryFilter) {
-            entries = entries.filter(e => e.category_id == categoryFilter);
-        }
+        // Date and category filters are applied server-side
+        const response = await cachedFetch(buildListingUrl('/api/stock-entries', {
+            date: dateFilter,
+            category_id: categoryFilter
+        }));
+        const entries = await response.json();
         
         // Add category names
-        entries = entries.map(e => ({
+        return entries.map(e => ({
             ...e,
-            categoryName: categoryMap[e.category_id] || 'Unknown'
+            categoryName: e.category || 'Unknown'
         }));
-        
-        return entries;
     } catch (error) {
         console.error('Error fetching entries:', error);
         return [];
@@ -2532,7 +2579,7 @@ async function loadSaleSessionEntries() {
         if (partyId) {
             url += `&party_id=${partyId}`;
         }
-        const response = await fetch(url);
+        const response = await cachedFetch(url);
         const entries = await response.json();
         
         const tbody = document.getElementById('saleSessionEntriesBody');
@@ -0,0 +1,38 @@
+"""
+Shared fixtures. The app runs against a scratch database that is dropped and rebuilt through
+upgrade_database() for every test, so each test starts from a freshly migrated schema.
+"""
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch database before it is imported
+_tmp_dir = tempfile.mkdtemp(prefix='lot-tests-')
+os.environ['LOT_DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp_dir, 'test.db')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import (app as lot_app, db, upgrade_database, set_schema_version, availability_index,
+                 _bump_table_versions, TRACKED_TABLES)
+
+
+@pytest.fixture
+def app():
+    with lot_app.app_context():
+        db.session.remove()
+        db.drop_all()
+        set_schema_version(0)
+        db.session.commit()
+        upgrade_database()
+        # Forget per-process state built from the previous test's database
+        availability_index.clear()
+        _bump_table_versions(TRACKED_TABLES)
+        yield lot_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
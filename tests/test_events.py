@@ -0,0 +1,39 @@
+"""Live-update streams are capped so they cannot take every server thread."""
+import threading
+
+import app as lot
+
+
+def test_streams_beyond_the_limit_are_refused(client, monkeypatch):
+    client.post('/register', json={'username': 'clerk', 'password': 'clerk'})
+    monkeypatch.setattr(lot, '_event_stream_slots', threading.BoundedSemaphore(1))
+
+    first = client.get('/api/events')
+    assert first.status_code == 200
+    refused = client.get('/api/events')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == str(lot.SSE_RETRY_AFTER_SECONDS)
+
+    # Closing the first stream frees its slot
+    first.close()
+    second = client.get('/api/events')
+    assert second.status_code == 200
+    second.close()
+
+
+def test_write_counter_is_read_at_most_once_per_interval(app, client, monkeypatch):
+    client.post('/register', json={'username': 'clerk', 'password': 'clerk'})
+    monkeypatch.setitem(app.config, 'EXTERNAL_WRITE_CHECK_SECONDS', 3600)
+    monkeypatch.setattr(lot, 'external_writes', lot.ExternalWrites())
+    reads = []
+    real_execute = lot.db.session.execute
+
+    def execute(statement, *args, **kwargs):
+        if 'write_counter' in str(statement):
+            reads.append(statement)
+        return real_execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(lot.db.session, 'execute', execute)
+    for _ in range(3):
+        assert client.get('/api/user-info').status_code == 200
+    assert len(reads) == 1
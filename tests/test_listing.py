@@ -0,0 +1,38 @@
+"""The listing and export endpoints issue a fixed number of SQL statements, however many rows they return."""
+import pytest
+from sqlalchemy import event
+
+from app import db
+from benchmarks.bench_listing import ENDPOINTS, MAX_STATEMENTS, PASSWORD, USERNAME, seed, seed_reference_data
+
+
+@pytest.fixture
+def statements(app):
+    executed = []
+
+    def count(*args):
+        executed.append(args[2])
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_listing_statement_count(app, client, statements, endpoint, monkeypatch):
+    # Read the write counter on every request, so each one issues the same statements
+    monkeypatch.setitem(app.config, 'EXTERNAL_WRITE_CHECK_SECONDS', 0)
+    user_id = seed_reference_data()
+    client.post('/login', json={'username': USERNAME, 'password': PASSWORD})
+
+    counts = []
+    for rows in (10, 500):
+        seed(rows, user_id)
+        statements.clear()
+        response = client.get(endpoint)
+        response.get_data()
+        assert response.status_code == 200
+        assert len(statements) <= MAX_STATEMENTS, statements
+        counts.append(len(statements))
+    # No per-row queries: 50 times the rows, the same statements
+    assert counts[0] == counts[1]
@@ -0,0 +1,35 @@
+"""Request metrics and slow-request profiling also cover requests whose view raises."""
+import pytest
+
+import app as lot
+
+
+class FakeProfiler:
+    def __init__(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+def test_failed_request_is_counted_and_profiler_stopped(app, client, monkeypatch):
+    client.post('/register', json={'username': 'clerk', 'password': 'clerk'})
+    profilers = []
+
+    def start_profiler():
+        profilers.append(FakeProfiler())
+        return profilers[-1]
+
+    def broken_view():
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(lot, '_start_profiler', start_profiler)
+    monkeypatch.setitem(app.config, 'PROFILE_SLOW_MS', 1e9)
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', True)
+    monkeypatch.setitem(app.view_functions, 'user_info', broken_view)
+
+    with pytest.raises(RuntimeError):
+        client.get('/api/user-info')
+
+    assert profilers and not profilers[-1].running
+    assert 'lot_http_requests_total{method="GET",route="/api/user-info",status="500"} 1' in lot.request_metrics.render()
@@ -0,0 +1,11 @@
+"""The hot queries are planned with their indexes on a freshly migrated database (see benchmarks/check_query_plans.py)."""
+from benchmarks.check_query_plans import cases, plan_for
+
+
+def test_hot_queries_use_their_indexes(app):
+    misses = []
+    for description, query, index in cases():
+        plan = plan_for(query)
+        if not any(index in line for line in plan):
+            misses.append(f"{description} does not use {index}: {' | '.join(plan)}")
+    assert not misses, '\n'.join(misses)
@@ -0,0 +1,26 @@
+"""Batch sale posting reports malformed ranges per range instead of failing the request."""
+from app import db, Category, StockEntry
+
+
+def test_batch_rejects_non_object_ranges(client):
+    client.post('/register', json={'username': 'clerk', 'password': 'clerk'})
+    db.session.add(Category(name='M-5', series='M', denomination='5', purchase_rate=4, sale_rate=5))
+    db.session.commit()
+    client.post('/api/stock-entries', json={'category_id': 1, 'entry_date': '2026-01-01', 'ticket_code': '61A',
+                                            'start_number': '0001', 'end_number': '0100', 'rate': 4, 'quantity': 500})
+
+    response = client.post('/api/sale-entries/batch', json={'entry_date': '2026-01-02', 'ranges': [
+        {'category_id': 1, 'ticket_code': '61A', 'start_number': '0001', 'end_number': '0010'}, 5]})
+    assert response.status_code == 400
+    results = response.get_json()['results']
+    assert results[1] == {'index': 1, 'success': False, 'message': 'Range must be an object'}
+    assert not results[0]['success']
+    # Nothing was deducted
+    assert [(e.start_number, e.end_number) for e in StockEntry.query.all()] == [('0001', '0100')]
+
+
+def test_batch_requires_a_list_of_ranges(client):
+    client.post('/register', json={'username': 'clerk', 'password': 'clerk'})
+    response = client.post('/api/sale-entries/batch', json={'entry_date': '2026-01-02', 'ranges': {'0': {}}})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'ranges must be a list'
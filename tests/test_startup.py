@@ -0,0 +1,15 @@
+"""Cold start of the desktop launcher stays within the startup target (see benchmarks/check_startup.py)."""
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.check_startup import STARTUP_BUDGET, launch
+
+
+def test_startup_within_budget(tmp_path):
+    database_path = str(tmp_path / 'startup.db')
+    launch(database_path)  # The first launch creates the schema
+    walls = [launch(database_path)[0] for _ in range(3)]
+    assert statistics.median(walls) <= STARTUP_BUDGET